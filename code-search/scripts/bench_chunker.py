@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Benchmark chunk_file on large and pathological generated sources.
+
+Cases: a 10k+ line Python module, a 10k+ line JavaScript module, Java
+classes with large inner classes, minified JavaScript (everything on one
+line, loose or wrapped in one function), and deeply nested blocks that
+would overflow Python's recursion limit in a recursive tree walk. Each run
+uses a fresh file path, so the incremental re-parse cache never kicks in.
+
+Exits non-zero if any case raises (e.g. RecursionError).
+
+Usage:
+    uv run python scripts/bench_chunker.py [runs]
+"""
+
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+def python_module(classes: int = 500) -> str:
+    parts = ["import os\n"]
+    for c in range(classes):
+        parts.append(f"\n\nclass Handler{c}(Base):\n    \"\"\"Handler {c}.\"\"\"\n\n    limit = {c}\n")
+        for m in range(3):
+            parts.append(
+                f"\n    def method_{m}(self, value):\n"
+                f"        total = value + self.limit * {m}\n"
+                f"        for item in range(total):\n"
+                f"            total += os.getpid() % (item + 1)\n"
+                f"        return total\n"
+            )
+        parts.append(f"\n\ndef helper_{c}(x):\n    return Handler{c}().method_0(x)\n")
+    return "".join(parts)
+
+
+def js_module(classes: int = 500) -> str:
+    parts = []
+    for c in range(classes):
+        parts.append(f"class Widget{c} extends Base {{\n  constructor() {{\n    super();\n    this.n = {c};\n  }}\n")
+        for m in range(3):
+            parts.append(
+                f"  render{m}(props) {{\n"
+                f"    const items = props.items.map((x) => x * {m});\n"
+                f"    return items.filter((x) => x > this.n);\n"
+                f"  }}\n"
+            )
+        parts.append(f"}}\n\nconst make{c} = (props) => {{\n  return new Widget{c}(props);\n}};\n\n")
+    return "".join(parts)
+
+
+def java_inner_classes(classes: int = 200, methods: int = 40) -> str:
+    parts = []
+    for c in range(classes):
+        parts.append(f"public class Outer{c} {{\n    private int x;\n\n    public static class Builder {{\n")
+        parts += [
+            f"        public Builder set{m}(int v) {{ this.f{m} = v * {c}; return this; }}\n"
+            for m in range(methods)
+        ]
+        parts.append(f"    }}\n\n    public int top() {{\n        return x + {c};\n    }}\n}}\n\n")
+    return "".join(parts)
+
+
+def minified_js(functions: int = 300) -> str:
+    return "".join(
+        f"function f{i}(a,b){{var c=a+b*{i};if(c>{i}){{return c-a}}return f{i}(b,c)}}"
+        for i in range(functions)
+    )
+
+
+def minified_bundle(functions: int = 300) -> str:
+    return "function bundle(){" + minified_js(functions) + "}"
+
+
+def nested_js(depth: int = 3000) -> str:
+    lines = ["function deep(x) {"]
+    lines += [f"if (x > {i}) {{ x = x - {i};" for i in range(depth)]
+    lines += ["}"] * depth
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def nested_literal(depth: int = 3000) -> str:
+    return "const table = " + "[" * depth + "0" + "]" * depth + ";\n"
+
+
+CASES = [
+    ("python, 10k+ lines", ".py", python_module),
+    ("javascript, 10k+ lines", ".js", js_module),
+    ("java inner classes", ".java", java_inner_classes),
+    ("minified javascript", ".js", minified_js),
+    ("minified bundle", ".js", minified_bundle),
+    ("nested blocks, depth 3000", ".js", nested_js),
+    ("nested literal, depth 3000", ".js", nested_literal),
+]
+
+
+def main() -> int:
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    from code_search.chunker import chunk_file
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench-chunker-"))
+    failed = False
+    for name, ext, generate in CASES:
+        source = generate()
+        times = []
+        try:
+            for run in range(runs):
+                path = workdir / f"{generate.__name__}_{run}{ext}"
+                path.write_text(source)
+                start = time.perf_counter()
+                chunks = chunk_file(str(path))
+                times.append(time.perf_counter() - start)
+        except Exception as e:
+            print(f"{name:28s} FAILED: {type(e).__name__}: {e}")
+            failed = True
+            continue
+        lines = source.count("\n") + 1
+        print(
+            f"{name:28s} {lines:6d} lines {len(source) / 1024:7.0f} KiB  "
+            f"median {statistics.median(times) * 1000:8.1f} ms  {len(chunks):5d} chunks  "
+            f"largest {max((len(c.source_code) for c in chunks), default=0):6d} chars"
+        )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
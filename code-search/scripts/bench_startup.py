@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Benchmark MCP server startup: time from spawn to the first responses.
+
+Spawns `python -m code_search` over stdio, as Claude Code does once per
+session, and times the `initialize` response (the handshake) and the
+`tools/list` response after it. Also reports which code_search modules
+the server imported before answering, to catch heavy imports creeping back
+in. Uses a throwaway HOME so no real index is touched.
+
+Usage:
+    uv run python scripts/bench_startup.py [runs]
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PROTOCOL_VERSION = "2025-06-18"
+
+# Modules that should only load on the first tool call that needs them
+DEFERRED_MODULES = ("numpy", "code_search.store", "code_search.embedder", "code_search.indexer")
+
+
+def _send(proc: subprocess.Popen, message: dict) -> None:
+    proc.stdin.write(json.dumps(message) + "\n")
+    proc.stdin.flush()
+
+
+def _receive(proc: subprocess.Popen, request_id: int) -> dict:
+    while True:
+        line = proc.stdout.readline()
+        if not line:
+            raise RuntimeError("Server exited before responding")
+        message = json.loads(line)
+        if message.get("id") == request_id:
+            return message
+
+
+def run_once(env: dict[str, str]) -> tuple[float, float]:
+    """Spawn the server once; return seconds to initialize and tools/list responses."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "code_search"],
+        env=env,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    try:
+        _send(
+            proc,
+            {
+                "jsonrpc": "2.0",
+                "id": 1,
+                "method": "initialize",
+                "params": {
+                    "protocolVersion": PROTOCOL_VERSION,
+                    "capabilities": {},
+                    "clientInfo": {"name": "bench-startup", "version": "0"},
+                },
+            },
+        )
+        _receive(proc, 1)
+        initialized = time.perf_counter() - start
+        _send(proc, {"jsonrpc": "2.0", "method": "notifications/initialized"})
+        _send(proc, {"jsonrpc": "2.0", "id": 2, "method": "tools/list"})
+        _receive(proc, 2)
+        listed = time.perf_counter() - start
+    finally:
+        proc.stdin.close()
+        proc.wait(timeout=10)
+    return initialized, listed
+
+
+def deferred_imports_loaded(env: dict[str, str]) -> list[str]:
+    """Modules from DEFERRED_MODULES that importing the server pulls in."""
+    code = (
+        "import sys, code_search.server; "
+        f"print(' '.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True
+    )
+    return result.stdout.split()
+
+
+def main() -> int:
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    env = {**os.environ, "HOME": tempfile.mkdtemp(prefix="bench-startup-")}
+
+    run_once(env)  # Warm the OS file cache; not counted
+    results = [run_once(env) for _ in range(runs)]
+    for name, times in [
+        ("initialize", [r[0] for r in results]),
+        ("tools/list", [r[1] for r in results]),
+    ]:
+        print(
+            f"{name:12s} median {statistics.median(times) * 1000:7.1f} ms  "
+            f"min {min(times) * 1000:7.1f} ms  ({runs} runs)"
+        )
+
+    loaded = deferred_imports_loaded(env)
+    if loaded:
+        print(f"Imported before the handshake: {', '.join(loaded)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Benchmark CodeSearchStore write throughput (chunks/second).
+
+Compares the original per-row INSERT with the embedding as a BLOB column
+(one commit per chunk, reproduced here on the original schema), today's
+insert_chunk (one commit per chunk, embedding appended to the sidecar),
+replace_file_chunks (one commit per file) and replace_file_chunks inside
+store.batch() (one commit for everything). Uses a throwaway HOME so no real
+index is touched.
+
+Usage:
+    uv run python scripts/bench_store_inserts.py [files] [chunks_per_file]
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+DIMENSIONS = 256
+
+# Schema before embeddings moved to the sidecar file
+BASELINE_SCHEMA_SQL = """
+CREATE TABLE chunks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_path TEXT NOT NULL,
+    file_mtime REAL NOT NULL,
+    chunk_type TEXT NOT NULL,
+    chunk_name TEXT NOT NULL,
+    start_line INTEGER NOT NULL,
+    end_line INTEGER NOT NULL,
+    source_code TEXT NOT NULL,
+    description TEXT,
+    embedding BLOB NOT NULL,
+    created_at REAL DEFAULT (unixepoch('now'))
+);
+CREATE INDEX idx_chunks_file ON chunks(file_path);
+CREATE INDEX idx_chunks_mtime ON chunks(file_path, file_mtime);
+"""
+
+
+def _make_chunks(count: int):
+    from code_search.chunker import CodeChunk
+
+    return [
+        CodeChunk(
+            chunk_type="function",
+            chunk_name=f"func_{i}",
+            start_line=i * 10 + 1,
+            end_line=i * 10 + 9,
+            source_code=f"def func_{i}():\n    return {i}\n" * 4,
+        )
+        for i in range(count)
+    ]
+
+
+def bench_baseline(conn, files, chunks, embeddings) -> None:
+    for file_path in files:
+        conn.execute("DELETE FROM chunks WHERE file_path = ?", (file_path,))
+        conn.commit()
+        for chunk, embedding in zip(chunks, embeddings):
+            conn.execute(
+                """INSERT INTO chunks
+                   (file_path, file_mtime, chunk_type, chunk_name,
+                    start_line, end_line, source_code, description, embedding)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    file_path,
+                    1.0,
+                    chunk.chunk_type,
+                    chunk.chunk_name,
+                    chunk.start_line,
+                    chunk.end_line,
+                    chunk.source_code,
+                    None,
+                    embedding.astype(np.float32).tobytes(),
+                ),
+            )
+            conn.commit()
+
+
+def bench_insert_chunk(store, files, chunks, embeddings) -> None:
+    for file_path in files:
+        store.delete_file_chunks(file_path)
+        for chunk, embedding in zip(chunks, embeddings):
+            store.insert_chunk(
+                file_path=file_path,
+                file_mtime=1.0,
+                chunk_type=chunk.chunk_type,
+                chunk_name=chunk.chunk_name,
+                start_line=chunk.start_line,
+                end_line=chunk.end_line,
+                source_code=chunk.source_code,
+                embedding=embedding,
+            )
+
+
+def bench_replace(store, files, chunks, embeddings) -> None:
+    for file_path in files:
+        store.replace_file_chunks(file_path, 1.0, chunks, embeddings)
+
+
+def bench_replace_batched(store, files, chunks, embeddings) -> None:
+    with store.batch():
+        bench_replace(store, files, chunks, embeddings)
+
+
+def main() -> int:
+    n_files = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    per_file = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    os.environ["HOME"] = tempfile.mkdtemp(prefix="bench-store-")
+    from code_search.store import CodeSearchStore
+
+    chunks = _make_chunks(per_file)
+    embeddings = np.random.default_rng(0).standard_normal(
+        (per_file, DIMENSIONS), dtype=np.float32
+    )
+    total = n_files * per_file
+    files = [f"/bench/file_{i}.py" for i in range(n_files)]
+
+    def report(name: str, elapsed: float) -> None:
+        print(f"{name:32s} {total / elapsed:12,.0f} chunks/s  ({elapsed:.2f}s for {total} chunks)")
+
+    conn = sqlite3.connect(os.path.join(tempfile.mkdtemp(prefix="bench-baseline-"), "chunks.db"))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(BASELINE_SCHEMA_SQL)
+    start = time.perf_counter()
+    bench_baseline(conn, files, chunks, embeddings)
+    report("baseline (BLOB row per commit)", time.perf_counter() - start)
+    conn.close()
+
+    for name, bench in [
+        ("insert_chunk (sidecar)", bench_insert_chunk),
+        ("replace_file_chunks", bench_replace),
+        ("replace_file_chunks + batch()", bench_replace_batched),
+    ]:
+        store = CodeSearchStore(tempfile.mkdtemp(prefix="bench-project-"))
+        start = time.perf_counter()
+        bench(store, files, chunks, embeddings)
+        elapsed = time.perf_counter() - start
+        store.close()
+        report(name, elapsed)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
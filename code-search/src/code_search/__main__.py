@@ -2,4 +2,6 @@
 
 from code_search.server import main
 
-main()
+# Guarded so spawned chunking workers can re-import this module safely
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Embedding model registry and the runtimes (backends) that execute them."""
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Protocol
+
+if TYPE_CHECKING:
+    import numpy as np
+
+DEFAULT_MODEL = "nomic-ai/nomic-embed-text-v1.5"
+DEFAULT_DIMENSIONS = 256  # Matryoshka truncation of the default model
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    dimensions: int  # Native output size
+    matryoshka: bool  # Whether leading dimensions form a usable smaller embedding
+    query_prefix: str = ""
+    document_prefix: str = ""
+
+
+MODELS: dict[str, ModelSpec] = {
+    "nomic-ai/nomic-embed-text-v1.5": ModelSpec(
+        768, True, "search_query: ", "search_document: "
+    ),
+    # int8-quantized ONNX export of the same model: ~4x smaller, faster on CPU
+    "nomic-ai/nomic-embed-text-v1.5-Q": ModelSpec(
+        768, True, "search_query: ", "search_document: "
+    ),
+    # Trained on code; no Matryoshka truncation
+    "jinaai/jina-embeddings-v2-base-code": ModelSpec(768, False),
+    # Small general-purpose model (~65 MB)
+    "BAAI/bge-small-en-v1.5": ModelSpec(
+        384, False, "Represent this sentence for searching relevant passages: "
+    ),
+}
+
+
+def resolve_model(model_name: str, dimensions: int | None) -> tuple[ModelSpec, int]:
+    """Look up a model and check `dimensions` against it (None: its default)."""
+    spec = MODELS.get(model_name)
+    if spec is None:
+        raise ValueError(f"Unknown embedding model {model_name!r}; known: {', '.join(MODELS)}")
+    if dimensions is None:
+        dimensions = DEFAULT_DIMENSIONS if spec.matryoshka else spec.dimensions
+    if dimensions > spec.dimensions or (not spec.matryoshka and dimensions != spec.dimensions):
+        raise ValueError(
+            f"{model_name} supports "
+            + (f"up to {spec.dimensions}" if spec.matryoshka else f"only {spec.dimensions}")
+            + f" dimensions, not {dimensions}"
+        )
+    return spec, dimensions
+
+
+class EmbeddingBackend(Protocol):
+    """Runs a model: texts in (already prefixed), full-size vectors out."""
+
+    def load(self) -> None:
+        """Load the model; called once, before the first embed."""
+
+    def embed(self, texts: list[str], batch_size: int) -> "list[np.ndarray]": ...
+
+
+class FastEmbedBackend:
+    """fastembed (ONNX runtime) backend.
+
+    `threads` sets ONNX intra-op threads per session (default: all cores).
+    `parallel` splits large embed calls across that many worker processes,
+    each with its own session; 0 uses every core.
+    """
+
+    def __init__(self, model_name: str, threads: int | None = None, parallel: int | None = None):
+        self._model_name = model_name
+        self._threads = threads
+        self._parallel = parallel
+        self._model = None
+
+    def load(self) -> None:
+        from fastembed import TextEmbedding
+
+        self._model = TextEmbedding(model_name=self._model_name, threads=self._threads)
+
+    def embed(self, texts: list[str], batch_size: int) -> "list[np.ndarray]":
+        return list(self._model.embed(texts, batch_size=batch_size, parallel=self._parallel))
+
+
+BACKENDS = {"fastembed": FastEmbedBackend}
+
+
+def create_backend(
+    name: str, model_name: str, threads: int | None = None, parallel: int | None = None
+) -> EmbeddingBackend:
+    backend = BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(f"Unknown embedding backend {name!r}; known: {', '.join(BACKENDS)}")
+    return backend(model_name, threads=threads, parallel=parallel)
@@ -0,0 +1,112 @@
+"""Content-addressed embedding cache shared by every per-project index."""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_MAX_ENTRIES = 100_000  # ~100 MB at 256 float32 dims
+EVICT_FRACTION = 0.1  # Share of entries dropped when the cache is full
+SQL_VARIABLE_BATCH = 10_000  # Hashes bound per `IN (...)` query
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    text_hash TEXT NOT NULL,
+    model TEXT NOT NULL,
+    dimensions INTEGER NOT NULL,
+    vector BLOB NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (text_hash, model, dimensions)
+);
+CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used);
+"""
+
+
+def _cache_path() -> Path:
+    """Shared cache DB: ~/.claude/code-search/embedding-cache.db"""
+    cache_dir = Path.home() / ".claude" / "code-search"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir / "embedding-cache.db"
+
+
+class EmbeddingCache:
+    """Maps (text hash, model, dimensions) to a vector, evicting least recently used.
+
+    Safe to use from the embedding worker thread; concurrent server
+    processes share the file through SQLite's WAL locking.
+    """
+
+    def __init__(self, path: Path | None = None, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self._path = path or _cache_path()
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self._path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA_SQL)
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(
+        self, hashes: list[str], model: str, dimensions: int
+    ) -> dict[str, np.ndarray]:
+        """Look up cached vectors, marking hits as recently used."""
+        unique = list(set(hashes))
+        found: dict[str, np.ndarray] = {}
+        with self._lock:
+            for start in range(0, len(unique), SQL_VARIABLE_BATCH):
+                batch = unique[start : start + SQL_VARIABLE_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"""SELECT text_hash, vector FROM embeddings
+                        WHERE model = ? AND dimensions = ? AND text_hash IN ({placeholders})""",
+                    [model, dimensions, *batch],
+                ).fetchall()
+                for text_hash, vector in rows:
+                    found[text_hash] = np.frombuffer(vector, dtype=np.float32)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    """UPDATE embeddings SET last_used = ?
+                       WHERE text_hash = ? AND model = ? AND dimensions = ?""",
+                    [(now, h, model, dimensions) for h in found],
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(
+        self, items: dict[str, np.ndarray], model: str, dimensions: int
+    ) -> None:
+        """Store vectors, evicting the least recently used entries when full."""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.executemany(
+                """INSERT OR IGNORE INTO embeddings
+                   (text_hash, model, dimensions, vector, last_used)
+                   VALUES (?, ?, ?, ?, ?)""",
+                [
+                    (h, model, dimensions, np.asarray(v, dtype=np.float32).tobytes(), now)
+                    for h, v in items.items()
+                ],
+            )
+            self._count += max(cursor.rowcount, 0)
+            if self._count > self._max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        keep = int(self._max_entries * (1 - EVICT_FRACTION))
+        self._conn.execute(
+            """DELETE FROM embeddings WHERE rowid IN (
+                   SELECT rowid FROM embeddings ORDER BY last_used
+                   LIMIT max(0, (SELECT COUNT(*) FROM embeddings) - ?))""",
+            (keep,),
+        )
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self) -> None:
+        self._conn.close()
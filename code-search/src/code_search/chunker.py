@@ -1,29 +1,15 @@
 """Tree-sitter AST parsing + fallback line-based chunking."""
 
-from dataclasses import dataclass
+import importlib
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from pathlib import Path
 
-import tree_sitter_bash as ts_bash
-import tree_sitter_javascript as ts_javascript
-import tree_sitter_python as ts_python
-import tree_sitter_typescript as ts_typescript
-from tree_sitter import Language, Parser
-
-PYTHON_LANG = Language(ts_python.language())
-JS_LANG = Language(ts_javascript.language())
-TS_LANG = Language(ts_typescript.language_typescript())
-TSX_LANG = Language(ts_typescript.language_tsx())
-BASH_LANG = Language(ts_bash.language())
-
-EXTENSION_TO_LANGUAGE: dict[str, Language] = {
-    ".py": PYTHON_LANG,
-    ".js": JS_LANG,
-    ".jsx": JS_LANG,
-    ".ts": TS_LANG,
-    ".tsx": TSX_LANG,
-    ".sh": BASH_LANG,
-    ".bash": BASH_LANG,
-}
+from tree_sitter import Language, Parser, Tree
+
+from code_search.hashing import text_hash
 
 PYTHON_NODE_TYPES = {"function_definition", "class_definition"}
 JS_NODE_TYPES = {
@@ -34,12 +20,77 @@ JS_NODE_TYPES = {
 }
 BASH_NODE_TYPES = {"function_definition"}
 
-LANGUAGE_NODE_TYPES: dict[Language, set[str]] = {
-    PYTHON_LANG: PYTHON_NODE_TYPES,
-    JS_LANG: JS_NODE_TYPES,
-    TS_LANG: JS_NODE_TYPES,
-    TSX_LANG: JS_NODE_TYPES,
-    BASH_LANG: BASH_NODE_TYPES,
+GO_NODE_TYPES = {"function_declaration", "method_declaration", "type_declaration"}
+RUST_NODE_TYPES = {
+    "function_item",
+    "struct_item",
+    "enum_item",
+    "trait_item",
+    "impl_item",
+    "macro_definition",
+}
+JAVA_NODE_TYPES = {
+    "class_declaration",
+    "interface_declaration",
+    "enum_declaration",
+    "record_declaration",
+}
+C_NODE_TYPES = {
+    "function_definition",
+    "type_definition",
+    "struct_specifier",
+    "enum_specifier",
+    "union_specifier",
+    # Prototypes, extern and global variables, macros: most of a header
+    "declaration",
+    "preproc_def",
+    "preproc_function_def",
+}
+# Declarations and macros are mostly one line each, so runs of them are merged
+C_MERGE_TYPES = {"declaration", "preproc_def", "preproc_function_def"}
+CPP_NODE_TYPES = C_NODE_TYPES | {"class_specifier"}
+RUBY_NODE_TYPES = {"method", "singleton_method", "class"}
+SQL_NODE_TYPES = {"statement"}
+
+
+@dataclass(frozen=True)
+class Grammar:
+    """A tree-sitter grammar package and the node types chunked from its trees."""
+
+    module: str
+    node_types: frozenset[str]
+    function: str = "language"  # Returns the language pointer
+    # Node types merged with adjacent siblings of these types up to the token
+    # budget, as they are often a single short line (SQL statements, C prototypes)
+    merge_types: frozenset[str] = frozenset()
+
+
+# Grammars are imported the first time a file needs them, so neither server
+# startup nor a project pays for languages it doesn't contain. Files of a
+# language whose grammar is not installed fall back to line-based chunking.
+GRAMMARS: dict[str, Grammar] = {
+    ".py": Grammar("tree_sitter_python", frozenset(PYTHON_NODE_TYPES)),
+    ".js": Grammar("tree_sitter_javascript", frozenset(JS_NODE_TYPES)),
+    ".jsx": Grammar("tree_sitter_javascript", frozenset(JS_NODE_TYPES)),
+    ".ts": Grammar("tree_sitter_typescript", frozenset(JS_NODE_TYPES), "language_typescript"),
+    ".tsx": Grammar("tree_sitter_typescript", frozenset(JS_NODE_TYPES), "language_tsx"),
+    ".sh": Grammar("tree_sitter_bash", frozenset(BASH_NODE_TYPES)),
+    ".bash": Grammar("tree_sitter_bash", frozenset(BASH_NODE_TYPES)),
+    ".go": Grammar("tree_sitter_go", frozenset(GO_NODE_TYPES)),
+    ".rs": Grammar("tree_sitter_rust", frozenset(RUST_NODE_TYPES)),
+    ".java": Grammar("tree_sitter_java", frozenset(JAVA_NODE_TYPES)),
+    ".c": Grammar("tree_sitter_c", frozenset(C_NODE_TYPES), merge_types=frozenset(C_MERGE_TYPES)),
+    ".h": Grammar("tree_sitter_c", frozenset(C_NODE_TYPES), merge_types=frozenset(C_MERGE_TYPES)),
+    ".cpp": Grammar(
+        "tree_sitter_cpp", frozenset(CPP_NODE_TYPES), merge_types=frozenset(C_MERGE_TYPES)
+    ),
+    ".hpp": Grammar(
+        "tree_sitter_cpp", frozenset(CPP_NODE_TYPES), merge_types=frozenset(C_MERGE_TYPES)
+    ),
+    ".rb": Grammar("tree_sitter_ruby", frozenset(RUBY_NODE_TYPES)),
+    ".sql": Grammar(
+        "tree_sitter_sql", frozenset(SQL_NODE_TYPES), merge_types=frozenset(SQL_NODE_TYPES)
+    ),
 }
 
 INDEXABLE_EXTENSIONS = {
@@ -52,6 +103,56 @@ INDEXABLE_EXTENSIONS = {
 FALLBACK_CHUNK_LINES = 50
 FALLBACK_OVERLAP = 10
 
+# The embedding model truncates its input at 512 tokens, so longer chunks
+# are split. Tokens are estimated from the UTF-8 size (characters, for ASCII
+# code) rather than by running the model's tokenizer; code averages about 3
+# characters per token.
+MAX_CHUNK_TOKENS = 512
+CHARS_PER_TOKEN = 3
+
+CLASS_NODE_TYPES = {
+    "class_definition",
+    "class_declaration",
+    "interface_declaration",
+    "impl_item",
+    "trait_item",
+    "class_specifier",
+    "struct_specifier",
+    "class",
+}
+CLASS_BODY_TYPES = {
+    "class_body",
+    "block",
+    "interface_body",
+    "declaration_list",
+    "field_declaration_list",
+    "body_statement",
+}
+MEMBER_NODE_TYPES = {
+    "method_definition",
+    "function_definition",
+    "function_item",
+    "method_declaration",
+    "constructor_declaration",
+    "method",
+    "singleton_method",
+}
+# C/C++ type specifiers double as bare type references (`struct point *p;`);
+# only the ones with a body are definitions
+BODY_REQUIRED_TYPES = {"struct_specifier", "class_specifier", "enum_specifier", "union_specifier"}
+
+# Previous parse trees, per file, for incremental re-parsing of edited files.
+# Each process keeps its own, so this pays off where the same process chunks a
+# file repeatedly (watch mode, small load_code jobs), not in the chunking pool.
+MAX_CACHED_TREES = 64
+
+_local = threading.local()
+_grammar_languages: dict[Grammar, Language | None] = {}
+_language_grammars: dict[Language, Grammar] = {}
+_grammars_lock = threading.Lock()
+_trees: OrderedDict[str, tuple[Language, bytes, Tree]] = OrderedDict()
+_trees_lock = threading.Lock()
+
 
 @dataclass(frozen=True)
 class CodeChunk:
@@ -62,24 +163,154 @@ class CodeChunk:
     source_code: str
 
 
-def _get_chunk_name(node, source_lines: list[str]) -> str:
+@dataclass
+class ChunkDiff:
+    """How a file's new chunks relate to the chunks stored for it.
+
+    Chunks are matched on type, name and source hash (kept), then on type
+    and name alone (changed). Indexes refer to the new chunk list, ids to
+    the stored chunks.
+    """
+
+    kept: list[tuple[int, int]] = field(default_factory=list)  # (chunk id, index)
+    changed: list[tuple[int, int]] = field(default_factory=list)  # (chunk id, index)
+    added: list[int] = field(default_factory=list)
+    removed: list[int] = field(default_factory=list)
+
+
+def diff_chunks(
+    previous: list[tuple[int, str, str, str | None]], chunks: list[CodeChunk]
+) -> ChunkDiff:
+    """Match new chunks against stored (id, chunk_type, chunk_name, chunk_hash) rows."""
+    diff = ChunkDiff()
+    by_hash: dict[tuple, list[int]] = {}
+    for chunk_id, chunk_type, chunk_name, chunk_hash in previous:
+        by_hash.setdefault((chunk_type, chunk_name, chunk_hash), []).append(chunk_id)
+
+    unmatched = []
+    for i, chunk in enumerate(chunks):
+        ids = by_hash.get((chunk.chunk_type, chunk.chunk_name, text_hash(chunk.source_code)))
+        if ids:
+            diff.kept.append((ids.pop(), i))
+        else:
+            unmatched.append(i)
+
+    by_name: dict[tuple, list[int]] = {}
+    for (chunk_type, chunk_name, _), ids in by_hash.items():
+        by_name.setdefault((chunk_type, chunk_name), []).extend(ids)
+    for i in unmatched:
+        ids = by_name.get((chunks[i].chunk_type, chunks[i].chunk_name))
+        if ids:
+            diff.changed.append((ids.pop(), i))
+        else:
+            diff.added.append(i)
+    diff.removed = [chunk_id for ids in by_name.values() for chunk_id in ids]
+    return diff
+
+
+class _LineIndex:
+    """Line starts in the parsed UTF-8 buffer, for slicing chunks out of it.
+
+    Chunks are byte ranges of the buffer the tree was parsed from: their
+    text is decoded from a memoryview over it and their line numbers come
+    from a binary search over the line starts, so the source is never split
+    into lines or joined back together. A row is kept whole in a chunk unless
+    it is over the budget by itself (minified code); then chunks are cut at
+    node boundaries within the row.
+    """
+
+    def __init__(self, data: bytes):
+        self.view = memoryview(data)
+        self._size = len(data)
+        starts = [0]
+        offset = data.find(b"\n")
+        while offset != -1:
+            starts.append(offset + 1)
+            offset = data.find(b"\n", offset + 1)
+        self._starts = starts
+        self.line_count = len(starts)
+
+    def row_of(self, offset: int) -> int:
+        return bisect_right(self._starts, offset) - 1
+
+    def line_start(self, row: int) -> int:
+        return self._starts[row]
+
+    def line_end(self, row: int) -> int:
+        """Offset just past the row's newline."""
+        return self._starts[row + 1] if row + 1 < len(self._starts) else self._size
+
+    def content_end(self, row: int) -> int:
+        """Offset of the row's newline, or the end of the buffer."""
+        return self._starts[row + 1] - 1 if row + 1 < len(self._starts) else self._size
+
+    def fits(self, start: int, end: int) -> bool:
+        return end - start <= MAX_CHUNK_TOKENS * CHARS_PER_TOKEN
+
+    def snap_start(self, offset: int) -> int:
+        """Back to the start of the row, unless the row alone is over budget."""
+        row = self.row_of(offset)
+        start = self._starts[row]
+        return start if self.fits(start, self.line_end(row)) else offset
+
+    def snap_end(self, offset: int) -> int:
+        """On to the end of the row, unless the row alone is over budget."""
+        row = self.row_of(max(offset - 1, 0))
+        end = self.line_end(row)
+        return end if self.fits(self._starts[row], end) else offset
+
+    def text(self, start: int, end: int) -> str:
+        return str(self.view[start:end], "utf-8", "replace")
+
+    def span_text(self, start: int, end: int) -> str:
+        """Text of a chunk span, without the newline ending its last row."""
+        if end > start and self.view[end - 1] == 0x0A:
+            end -= 1
+        return self.text(start, end)
+
+
+def _get_chunk_name(node, lines: _LineIndex) -> str:
     """Extract a meaningful name from an AST node."""
+    # Rust impl blocks: named by the type, and the trait when there is one
+    if node.type == "impl_item" and (impl_type := node.child_by_field_name("type")):
+        name = lines.text(impl_type.start_byte, impl_type.end_byte)
+        impl_trait = node.child_by_field_name("trait")
+        if impl_trait is None:
+            return name
+        return f"{lines.text(impl_trait.start_byte, impl_trait.end_byte)} for {name}"
+
+    name = node.child_by_field_name("name")
+    # C/C++ functions and typedefs: the name sits at the end of the declarator chain
+    declarator = node.child_by_field_name("declarator")
+    while name is None and declarator is not None:
+        inner = declarator.child_by_field_name("declarator")
+        if inner is None:
+            name = declarator
+        declarator = inner
+    # Go type declarations: named by their type spec
+    if name is None and node.named_child_count:
+        name = node.named_children[0].child_by_field_name("name")
+    if name is not None:
+        return lines.text(name.start_byte, name.end_byte)
+
     # Look for name child
     for child in node.children:
         if child.type == "identifier":
-            return child.text.decode("utf-8")
+            return lines.text(child.start_byte, child.end_byte)
         if child.type == "property_identifier":
-            return child.text.decode("utf-8")
+            return lines.text(child.start_byte, child.end_byte)
 
     # For arrow functions, check parent variable_declarator
     if node.type == "arrow_function" and node.parent:
         if node.parent.type == "variable_declarator":
             for child in node.parent.children:
                 if child.type == "identifier":
-                    return child.text.decode("utf-8")
+                    return lines.text(child.start_byte, child.end_byte)
 
     # Fallback: first line trimmed
-    line = source_lines[node.start_point[0]].strip()
+    start = lines.snap_start(node.start_byte)
+    end = min(lines.content_end(lines.row_of(start)), start + MAX_CHUNK_TOKENS * CHARS_PER_TOKEN)
+    line = lines.text(start, end).strip()
     return line[:60] if len(line) > 60 else line
 
 
@@ -92,80 +323,414 @@ def _get_chunk_type(node) -> str:
         "class_declaration": "class",
         "method_definition": "method",
         "arrow_function": "function",
+        "function_item": "function",
+        "method_declaration": "method",
+        "constructor_declaration": "method",
+        "method": "method",
+        "singleton_method": "method",
+        "class": "class",
+        "class_specifier": "class",
+        "record_declaration": "class",
+        "interface_declaration": "interface",
+        "trait_item": "trait",
+        "impl_item": "impl",
+        "struct_item": "struct",
+        "struct_specifier": "struct",
+        "union_specifier": "struct",
+        "enum_item": "enum",
+        "enum_declaration": "enum",
+        "enum_specifier": "enum",
+        "type_declaration": "type",
+        "type_definition": "type",
+        "declaration": "declaration",
+        "preproc_def": "macro",
+        "preproc_function_def": "macro",
+        "macro_definition": "macro",
+        "statement": "statement",
     }
     return type_map.get(node.type, "block")
 
 
-def _walk_for_nodes(node, target_types: set[str]) -> list:
-    """Walk AST and collect nodes of target types."""
-    results = []
-    if node.type in target_types:
-        results.append(node)
-        # For classes, also look for methods inside
-        if node.type in ("class_definition", "class_declaration"):
-            for child in node.children:
-                if child.type == "class_body" or child.type == "block":
-                    for grandchild in child.children:
-                        if grandchild.type in ("method_definition", "function_definition"):
-                            results.append(grandchild)
-        return results
+def _class_members(node) -> list[tuple]:
+    """Methods and nested classes directly inside a class, as (outer node, definition node) pairs.
 
+    The outer node differs from the definition when decorators wrap it.
+    """
+    members = []
     for child in node.children:
-        # For arrow functions, only collect if parent is variable_declarator
-        if child.type == "arrow_function":
-            if node.type == "variable_declarator":
-                results.append(child)
+        if child.type not in CLASS_BODY_TYPES:
+            continue
+        for grandchild in child.children:
+            definition = grandchild
+            if grandchild.type == "decorated_definition":
+                definition = grandchild.child_by_field_name("definition")
+            if (
+                definition is not None
+                and (definition.type in MEMBER_NODE_TYPES or definition.type in CLASS_NODE_TYPES)
+                # Bodiless declarations (interface methods) stay in the class summary
+                and definition.child_by_field_name("body") is not None
+            ):
+                members.append((grandchild, definition))
+    return members
+
+
+def _class_definitions(node) -> list:
+    """A class's members, with the members of nested classes after each, in document order."""
+    definitions = []
+    stack = [iter(_class_members(node))]
+    while stack:
+        member = next(stack[-1], None)
+        if member is None:
+            stack.pop()
+            continue
+        definition = member[1]
+        definitions.append(definition)
+        if definition.type in CLASS_NODE_TYPES:
+            stack.append(iter(_class_members(definition)))
+    return definitions
+
+
+def _is_target(node, target_types: set[str]) -> bool:
+    return node.type in target_types and (
+        node.type not in BODY_REQUIRED_TYPES or node.child_by_field_name("body") is not None
+    )
+
+
+def _walk_for_nodes(root, target_types: set[str]) -> list:
+    """Collect nodes of target types, in document order.
+
+    Iterates with a TreeCursor instead of recursing, so deeply nested code
+    cannot hit the recursion limit. Collected nodes are not descended into,
+    except that a class's methods and nested classes are collected along
+    with it.
+    """
+    results = []
+    cursor = root.walk()
+    while True:
+        node = cursor.node
+        descend = False
+        if node.type == "arrow_function" and cursor.depth:
+            # Only named arrow functions (`const f = () => ...`) are chunks
+            if node.parent.type == "variable_declarator":
+                results.append(node)
+        elif _is_target(node, target_types):
+            results.append(node)
+            if node.type in CLASS_NODE_TYPES:
+                results.extend(_class_definitions(node))
         else:
-            results.extend(_walk_for_nodes(child, target_types))
+            descend = True
+
+        if descend and cursor.goto_first_child():
+            continue
+        while not cursor.goto_next_sibling():
+            if not cursor.goto_parent():
+                return results
+
+
+def _get_language(ext: str) -> Language | None:
+    """The tree-sitter language for a file extension, importing its grammar if needed."""
+    grammar = GRAMMARS.get(ext)
+    if grammar is None:
+        return None
+    with _grammars_lock:
+        if grammar not in _grammar_languages:
+            try:
+                module = importlib.import_module(grammar.module)
+                language = Language(getattr(module, grammar.function)())
+                _language_grammars[language] = grammar
+            except ImportError:
+                language = None
+            _grammar_languages[grammar] = language
+        return _grammar_languages[grammar]
+
+
+def _get_parser(language: Language) -> Parser:
+    """Parser for `language`, cached per thread (and so per pool worker)."""
+    parsers = getattr(_local, "parsers", None)
+    if parsers is None:
+        parsers = _local.parsers = {}
+    parser = parsers.get(language)
+    if parser is None:
+        parser = parsers[language] = Parser(language)
+    return parser
+
+
+def _split_rows(start: int, end: int, lines: _LineIndex) -> list[tuple[int, int]]:
+    """Split a byte range at row boundaries into runs of rows within the budget."""
+    spans = []
+    span_start = start
+    for row in range(lines.row_of(start) + 1, lines.row_of(max(end - 1, start)) + 1):
+        if not lines.fits(span_start, min(lines.line_end(row), end)):
+            spans.append((span_start, lines.line_start(row)))
+            span_start = lines.line_start(row)
+    spans.append((span_start, end))
+    return spans
+
+
+def _merge_pieces(
+    start: int, end: int, pieces: list[tuple[int, int]], lines: _LineIndex
+) -> list[tuple[int, int]]:
+    """Merge consecutive child spans of the range start..end into spans within the budget."""
+    spans = []
+    span_start = covered = start
+    for _, piece_end in pieces:
+        # Children sharing a row snap to the same whole row
+        if piece_end <= covered:
+            continue
+        if covered == span_start or lines.fits(span_start, piece_end):
+            covered = piece_end
+        else:
+            spans.append((span_start, covered))
+            span_start, covered = covered, piece_end
+    spans.append((span_start, max(covered, end)))
+    return spans
+
+
+def _split_node(node, lines: _LineIndex) -> list[tuple[int, int]]:
+    """Byte spans covering `node`, each within the token budget where possible.
+
+    Oversized nodes are split at child boundaries, descending into children
+    that are oversized themselves; adjacent small children are merged back
+    together. Text between children (comments, blank lines) stays attached
+    to the preceding span. Rows over budget by themselves (minified code) are
+    split at child boundaries like any other node; only a single token over
+    budget on one row is left whole. Uses an explicit stack, so deeply nested
+    code cannot hit the recursion limit.
+    """
+    stack = []  # (start, end, remaining children, pieces so far)
+    while True:
+        start, end = lines.snap_start(node.start_byte), lines.snap_end(node.end_byte)
+        fits = lines.fits(start, end)
+        children = [] if fits else node.children
+        if children:
+            remaining = iter(children)
+            stack.append((start, end, remaining, []))
+            node = next(remaining)
+            continue
+
+        spans = [(start, end)] if fits else _split_rows(start, end, lines)
+        # Hand the spans to the parent, merging every parent whose children are done
+        while stack:
+            stack[-1][3].extend(spans)
+            node = next(stack[-1][2], None)
+            if node is not None:
+                break
+            start, end, _, pieces = stack.pop()
+            spans = _merge_pieces(start, end, pieces, lines)
+        else:
+            return spans
+
+
+def _group_siblings(nodes: list, merge_types: frozenset[str], lines: _LineIndex) -> list[list]:
+    """Group runs of sibling `merge_types` nodes whose combined span fits the token budget.
+
+    Other nodes, and mergeable ones over budget by themselves, stay alone.
+    """
+    groups = []
+    for node in nodes:
+        if groups and node.type in merge_types:
+            group = groups[-1]
+            start = lines.snap_start(group[0].start_byte)
+            if (
+                group[-1].type in merge_types
+                and group[-1].parent == node.parent
+                and lines.fits(start, lines.snap_end(node.end_byte))
+            ):
+                group.append(node)
+                continue
+        groups.append([node])
+    return groups
+
+
+def _class_summary(node, members: list[tuple], lines: _LineIndex) -> str:
+    """The class with method bodies left out: its header, attributes and signatures.
+
+    Method and nested class bodies get chunks of their own, so repeating them
+    here would only embed the same text twice. A member written on one row keeps its
+    signature up to the body. Only the text kept counts towards the budget.
+    """
+    start, end = lines.snap_start(node.start_byte), lines.snap_end(node.end_byte)
+    kept = []
+    for outer, definition in members:
+        body = definition.child_by_field_name("body")
+        # Hide whole rows from the body's first row on, or the row after it when
+        # the signature ends there (`def f(self) {`)
+        row = body.start_point[0]
+        if lines.text(lines.line_start(row), body.start_byte).strip():
+            row += 1
+        if row <= outer.end_point[0]:
+            hide_start, hide_end = lines.line_start(row), lines.snap_end(outer.end_byte)
+        else:
+            hide_start = body.start_byte
+            while hide_start > start and lines.view[hide_start - 1] in b" \t":
+                hide_start -= 1
+            hide_end = outer.end_byte
+        if hide_start > start:
+            kept.append((start, hide_start))
+        start = max(start, hide_end)
+    kept.append((start, end))
+
+    budget = MAX_CHUNK_TOKENS * CHARS_PER_TOKEN
+    parts = []
+    for piece_start, piece_end in kept:
+        if piece_end - piece_start > budget:
+            # Cut at the last row boundary that fits; mid-row only if nothing else is kept
+            cut = lines.line_start(lines.row_of(piece_start + budget))
+            if cut <= piece_start and not parts:
+                cut = piece_start + budget
+                while lines.view[cut] & 0xC0 == 0x80:  # Inside a UTF-8 sequence
+                    cut -= 1
+            if cut > piece_start:
+                parts.append(lines.text(piece_start, cut))
+            break
+        parts.append(lines.text(piece_start, piece_end))
+        budget -= piece_end - piece_start
+    return "".join(parts).removesuffix("\n")
+
+
+def _common_prefix_length(a: bytes, b: bytes) -> int:
+    """Length of the common prefix, by binary search over slice comparisons."""
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[low:mid] == b[low:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def _point_at(data: bytes, offset: int) -> tuple[int, int]:
+    row = data.count(b"\n", 0, offset)
+    return row, offset - (data.rfind(b"\n", 0, offset) + 1)
+
+
+def _parse(data: bytes, language: Language, key: str | None) -> Tree:
+    """Parse `data`, reusing the previous tree for `key` when there is one.
+
+    The edit between the old and new bytes is described to tree-sitter as a
+    single replaced range (common prefix and suffix left alone), so only the
+    affected part of the tree is re-parsed.
+    """
+    parser = _get_parser(language)
+    if key is None:
+        return parser.parse(data)
+    with _trees_lock:
+        previous = _trees.pop(key, None)
+
+    old_tree = None
+    if previous is not None and previous[0] == language:
+        _, old_data, old_tree = previous
+        start = _common_prefix_length(old_data, data)
+        suffix = _common_prefix_length(old_data[start:][::-1], data[start:][::-1])
+        old_end, new_end = len(old_data) - suffix, len(data) - suffix
+        old_tree.edit(
+            start_byte=start,
+            old_end_byte=old_end,
+            new_end_byte=new_end,
+            start_point=_point_at(data, start),
+            old_end_point=_point_at(old_data, old_end),
+            new_end_point=_point_at(data, new_end),
+        )
 
-    return results
+    tree = parser.parse(data, old_tree) if old_tree is not None else parser.parse(data)
+    with _trees_lock:
+        _trees[key] = (language, data, tree)
+        while len(_trees) > MAX_CACHED_TREES:
+            _trees.popitem(last=False)
+    return tree
 
 
-def _chunk_with_tree_sitter(source: str, language: Language) -> list[CodeChunk]:
-    """Parse source with tree-sitter and extract semantic chunks."""
-    parser = Parser(language)
-    tree = parser.parse(source.encode("utf-8"))
-    source_lines = source.split("\n")
-    target_types = LANGUAGE_NODE_TYPES.get(language, set())
+def _chunk_with_tree_sitter(
+    source: str, language: Language, key: str | None = None
+) -> list[CodeChunk]:
+    """Parse source with tree-sitter and extract semantic chunks.
+
+    `key` (the file path) enables incremental re-parsing on later calls.
+    """
+    data = source.encode("utf-8")
+    tree = _parse(data, language, key)
+    lines = _LineIndex(data)
+    grammar = _language_grammars.get(language)
+    target_types = grammar.node_types if grammar else frozenset()
 
     nodes = _walk_for_nodes(tree.root_node, target_types)
 
+    if grammar and grammar.merge_types:
+        groups = _group_siblings(nodes, grammar.merge_types, lines)
+    else:
+        groups = [[node] for node in nodes]
+
     chunks = []
-    for node in nodes:
+    for group in groups:
+        node = group[0]
+        chunk_type = _get_chunk_type(node)
+        chunk_name = _get_chunk_name(node, lines)
+        if len(group) > 1:
+            start = lines.snap_start(node.start_byte)
+            end = lines.snap_end(group[-1].end_byte)
+            chunks.append(
+                CodeChunk(
+                    chunk_type=chunk_type,
+                    chunk_name=f"{chunk_name} (+{len(group) - 1} more)",
+                    start_line=lines.row_of(start) + 1,
+                    end_line=lines.row_of(max(end - 1, start)) + 1,
+                    source_code=lines.span_text(start, end),
+                )
+            )
+            continue
+
         start_line = node.start_point[0] + 1  # 1-indexed
         end_line = node.end_point[0] + 1
-        chunk_source = "\n".join(source_lines[start_line - 1 : end_line])
-        chunks.append(
-            CodeChunk(
-                chunk_type=_get_chunk_type(node),
-                chunk_name=_get_chunk_name(node, source_lines),
-                start_line=start_line,
-                end_line=end_line,
-                source_code=chunk_source,
+
+        members = _class_members(node) if node.type in CLASS_NODE_TYPES else []
+        if members:
+            chunks.append(
+                CodeChunk(
+                    chunk_type=chunk_type,
+                    chunk_name=chunk_name,
+                    start_line=start_line,
+                    end_line=end_line,
+                    source_code=_class_summary(node, members, lines),
+                )
+            )
+            continue
+
+        spans = _split_node(node, lines)
+        for part, (start, end) in enumerate(spans, 1):
+            name = chunk_name if len(spans) == 1 else f"{chunk_name} (part {part}/{len(spans)})"
+            chunks.append(
+                CodeChunk(
+                    chunk_type=chunk_type,
+                    chunk_name=name,
+                    start_line=lines.row_of(start) + 1,
+                    end_line=lines.row_of(max(end - 1, start)) + 1,
+                    source_code=lines.span_text(start, end),
+                )
             )
-        )
 
     return chunks
 
 
 def _chunk_by_lines(source: str, file_path: str) -> list[CodeChunk]:
     """Fallback: split into overlapping line-based chunks."""
-    lines = source.split("\n")
-    total = len(lines)
+    lines = _LineIndex(source.encode("utf-8"))
+    total = lines.line_count
     if total == 0:
         return []
 
+    name = Path(file_path).name
     chunks = []
     start = 0
     chunk_idx = 0
     while start < total:
         end = min(start + FALLBACK_CHUNK_LINES, total)
-        chunk_source = "\n".join(lines[start:end])
+        chunk_source = lines.text(lines.line_start(start), lines.content_end(end - 1))
         if chunk_source.strip():
             chunks.append(
                 CodeChunk(
                     chunk_type="text_block",
-                    chunk_name=f"{Path(file_path).name}:{start + 1}-{end}",
+                    chunk_name=f"{name}:{start + 1}-{end}",
                     start_line=start + 1,
                     end_line=end,
                     source_code=chunk_source,
@@ -193,9 +758,9 @@ def chunk_file(file_path: str) -> list[CodeChunk]:
     if not source.strip():
         return []
 
-    language = EXTENSION_TO_LANGUAGE.get(ext)
+    language = _get_language(ext)
     if language:
-        chunks = _chunk_with_tree_sitter(source, language)
+        chunks = _chunk_with_tree_sitter(source, language, key=str(path.resolve()))
         # If tree-sitter found nothing, fall back to line-based
         if not chunks:
             return _chunk_by_lines(source, file_path)
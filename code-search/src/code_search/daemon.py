@@ -0,0 +1,287 @@
+"""Shared embedding daemon: one model instance serving every server process.
+
+Each MCP server process would otherwise load its own copy of the ONNX
+model. With the daemon enabled, Embedder sends (already prefixed) texts over
+a Unix socket instead; the daemon coalesces requests that arrive within a
+few milliseconds of each other into one model batch.
+
+Run it with `python -m code_search.daemon`, or let DaemonBackend spawn it
+whenever none is running. It reads the same CODE_SEARCH_EMBED_* variables as the server and
+exits after IDLE_TIMEOUT seconds without requests.
+"""
+
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from code_search.backends import DEFAULT_MODEL, EmbeddingBackend, create_backend
+from code_search.embedder import DEFAULT_BATCH_SIZE
+
+BATCH_WINDOW = 0.005  # Seconds to wait for more requests before running a batch
+IDLE_TIMEOUT = 600  # Seconds without requests before the daemon exits
+SPAWN_TIMEOUT = 10  # Seconds a client waits for a spawned daemon to listen
+# Seconds before spawning again after a daemon that never listened; doubles
+# with each further failure, up to IDLE_TIMEOUT
+SPAWN_BACKOFF = 30
+REQUEST_TIMEOUT = 600  # Seconds a client waits for one embedding request
+
+_FRAME = struct.Struct(">II")  # Header length, payload length
+
+
+def socket_path(model_name: str) -> Path:
+    """Per-model socket: ~/.claude/code-search/embed-{hash}.sock"""
+    socket_dir = Path.home() / ".claude" / "code-search"
+    socket_dir.mkdir(parents=True, exist_ok=True)
+    return socket_dir / f"embed-{hashlib.sha256(model_name.encode()).hexdigest()[:12]}.sock"
+
+
+def _encode(header: dict, payload: bytes = b"") -> bytes:
+    data = json.dumps(header).encode()
+    return _FRAME.pack(len(data), len(payload)) + data + payload
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> tuple[dict, bytes]:
+    header_len, payload_len = _FRAME.unpack(await reader.readexactly(_FRAME.size))
+    header = json.loads(await reader.readexactly(header_len))
+    return header, await reader.readexactly(payload_len)
+
+
+def _recv_exactly(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("Embedding daemon closed the connection")
+        buf += chunk
+    return bytes(buf)
+
+
+class DaemonError(Exception):
+    pass
+
+
+class EmbeddingDaemon:
+    """Serves embedding requests on a Unix socket, batching across clients."""
+
+    def __init__(
+        self, backend: EmbeddingBackend, model_name: str, batch_size: int = DEFAULT_BATCH_SIZE
+    ):
+        self._backend = backend
+        self._model_name = model_name
+        self._batch_size = batch_size
+        self._queue: asyncio.Queue[tuple[list[str], asyncio.Future]] = asyncio.Queue()
+        self._last_request = time.monotonic()
+
+    async def serve(self, path: Path) -> None:
+        server = await asyncio.start_unix_server(self._handle, path=str(path))
+        batcher = asyncio.create_task(self._batcher())
+        try:
+            async with server:
+                while (
+                    time.monotonic() - self._last_request < IDLE_TIMEOUT or self._queue.qsize()
+                ):
+                    await asyncio.sleep(min(IDLE_TIMEOUT, 30))
+        finally:
+            batcher.cancel()
+            path.unlink(missing_ok=True)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._last_request = time.monotonic()
+        try:
+            header, _ = await _read_frame(reader)
+            if header.get("model") != self._model_name:
+                writer.write(_encode({"error": f"daemon serves {self._model_name}"}))
+            else:
+                future = asyncio.get_running_loop().create_future()
+                await self._queue.put((header["texts"], future))
+                try:
+                    vectors = await future
+                except Exception as e:
+                    writer.write(_encode({"error": f"{type(e).__name__}: {e}"}))
+                else:
+                    header = {"count": len(vectors), "dimensions": vectors.shape[1]}
+                    writer.write(_encode(header, vectors.tobytes()))
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _batcher(self) -> None:
+        """Run queued requests through the model, several clients per batch."""
+        try:
+            await asyncio.to_thread(self._backend.load)
+            load_error = None
+        except Exception as e:
+            load_error = e  # Reported to every client, which then embeds locally
+        while True:
+            requests = [await self._queue.get()]
+            total = len(requests[0][0])
+            deadline = time.monotonic() + BATCH_WINDOW
+            while total < self._batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    request = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                requests.append(request)
+                total += len(request[0])
+
+            texts = [text for request_texts, _ in requests for text in request_texts]
+            try:
+                if load_error is not None:
+                    raise load_error
+                embeddings = await asyncio.to_thread(self._backend.embed, texts, self._batch_size)
+                matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1)
+            except Exception as e:
+                for _, future in requests:
+                    future.set_exception(e)
+                continue
+            start = 0
+            for request_texts, future in requests:
+                future.set_result(matrix[start : start + len(request_texts)])
+                start += len(request_texts)
+
+
+class DaemonBackend:
+    """Client backend: embeds through the daemon, spawning it if needed.
+
+    Falls back to `fallback` (typically a local FastEmbedBackend) when the
+    daemon cannot be reached, so search keeps working without it.
+    """
+
+    def __init__(self, model_name: str, fallback: EmbeddingBackend, spawn: bool = True):
+        self._model_name = model_name
+        self._path = socket_path(model_name)
+        self._fallback = fallback
+        self._spawn = spawn
+        self._spawn_deadline = 0.0  # Until then, a spawned daemon may still start listening
+        self._next_spawn = 0.0
+        self._spawn_backoff = SPAWN_BACKOFF
+        self._fallback_loaded = False
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        pass  # The daemon owns the model; the fallback loads only if needed
+
+    def embed(self, texts: list[str], batch_size: int) -> list[np.ndarray]:
+        try:
+            return self._request(texts)
+        except (OSError, DaemonError):
+            if self._spawn and self._start_daemon():
+                try:
+                    return self._request(texts)
+                except (OSError, DaemonError):
+                    pass
+        with self._lock:
+            if not self._fallback_loaded:
+                self._fallback.load()
+                self._fallback_loaded = True
+        return self._fallback.embed(texts, batch_size)
+
+    def _request(self, texts: list[str]) -> list[np.ndarray]:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(REQUEST_TIMEOUT)
+            sock.connect(str(self._path))
+            sock.sendall(_encode({"model": self._model_name, "texts": texts}))
+            header_len, payload_len = _FRAME.unpack(_recv_exactly(sock, _FRAME.size))
+            header = json.loads(_recv_exactly(sock, header_len))
+            payload = _recv_exactly(sock, payload_len)
+        if "error" in header:
+            raise DaemonError(header["error"])
+        matrix = np.frombuffer(payload, dtype=np.float32).reshape(
+            header["count"], header["dimensions"]
+        )
+        return list(matrix)
+
+    def _start_daemon(self) -> bool:
+        """Spawn a detached daemon and wait for its socket.
+
+        The daemon exits when idle, so this runs again whenever it is gone.
+        Requests arriving while a spawn is starting wait for it rather than
+        spawning another; a spawn that never listens holds off the next one
+        for a growing backoff. A daemon spawned twice anyway loses the flock
+        in main() and exits.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now >= self._spawn_deadline:
+                # A daemon that is up but failed the request won't be helped by another
+                if now < self._next_spawn or self._listening():
+                    return False
+                subprocess.Popen(
+                    [sys.executable, "-m", "code_search.daemon"],
+                    env={**os.environ, "CODE_SEARCH_EMBED_MODEL": self._model_name},
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    start_new_session=True,
+                )
+                self._spawn_deadline = now + SPAWN_TIMEOUT
+            deadline = self._spawn_deadline
+        while time.monotonic() < deadline:
+            if self._listening():
+                with self._lock:
+                    self._spawn_deadline = 0.0  # Up: once it exits, spawn again right away
+                    self._spawn_backoff = SPAWN_BACKOFF
+                return True
+            time.sleep(0.05)
+        with self._lock:
+            if self._next_spawn < deadline:  # First waiter on this spawn to give up
+                self._next_spawn = deadline + self._spawn_backoff
+                self._spawn_backoff = min(2 * self._spawn_backoff, IDLE_TIMEOUT)
+        return False
+
+    def _listening(self) -> bool:
+        """Whether a daemon accepts connections on the socket.
+
+        The socket file alone proves nothing: a crashed daemon leaves it
+        behind until the new one unlinks and re-binds it.
+        """
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            try:
+                sock.connect(str(self._path))
+            except OSError:
+                return False
+        return True
+
+
+def main() -> None:
+    model_name = os.environ.get("CODE_SEARCH_EMBED_MODEL", DEFAULT_MODEL)
+    path = socket_path(model_name)
+
+    # One daemon per model: a second one started concurrently just exits
+    lock = open(path.with_suffix(".lock"), "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return
+    path.unlink(missing_ok=True)  # Left behind by a daemon that crashed
+
+    threads = os.environ.get("CODE_SEARCH_EMBED_THREADS")
+    parallel = os.environ.get("CODE_SEARCH_EMBED_PARALLEL")
+    backend = create_backend(
+        os.environ.get("CODE_SEARCH_EMBED_BACKEND", "fastembed"),
+        model_name,
+        threads=int(threads) if threads else None,
+        parallel=int(parallel) if parallel else None,
+    )
+    batch_size = int(os.environ.get("CODE_SEARCH_EMBED_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+    asyncio.run(EmbeddingDaemon(backend, model_name, batch_size).serve(path))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,151 @@
-"""Embedding with nomic-embed-text-v1.5 via fastembed (ONNX)."""
+"""Document and query embedding on top of a pluggable backend (fastembed by default)."""
+
+import threading
+import time
+from collections import OrderedDict
 
 import numpy as np
 
+from code_search.backends import (
+    DEFAULT_MODEL,
+    EmbeddingBackend,
+    FastEmbedBackend,
+    resolve_model,
+)
+from code_search.cache import EmbeddingCache
+from code_search.hashing import text_hash
+
+DEFAULT_BATCH_SIZE = 128
+DEFAULT_QUERY_CACHE_SIZE = 256  # Recent query embeddings kept in memory
+
 
 class Embedder:
-    """Lazy-loaded embedding model using fastembed."""
+    """Lazy-loaded embedding model.
 
-    MODEL_NAME = "nomic-ai/nomic-embed-text-v1.5"
-    DIMENSIONS = 256  # Matryoshka truncation
+    Adds the model's query/document prefixes and truncates its output to
+    `dimensions` (Matryoshka models only; others must use their native size).
+    """
 
-    def __init__(self):
-        self._model = None
+    def __init__(
+        self,
+        cache: EmbeddingCache | None = None,
+        query_cache_size: int = DEFAULT_QUERY_CACHE_SIZE,
+        model_name: str = DEFAULT_MODEL,
+        dimensions: int | None = None,
+        backend: EmbeddingBackend | None = None,
+    ):
+        self._spec, self.dimensions = resolve_model(model_name, dimensions)
+        self.model_name = model_name
+        self._backend = backend or FastEmbedBackend(model_name)
+        self._loaded = False
+        self._cache = cache
+        self._model_lock = threading.Lock()
+        self._query_cache: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._query_cache_size = query_cache_size
+        self._model_load_seconds: float | None = None
+        self._queries = 0
+        self._query_cache_hits = 0
+        self._query_seconds = 0.0
+        self._documents = 0
+        self._document_seconds = 0.0
 
     def _ensure_model(self):
-        if self._model is None:
-            from fastembed import TextEmbedding
+        if self._loaded:
+            return
+        with self._model_lock:
+            if not self._loaded:
+                start = time.perf_counter()
+                self._backend.load()
+                self._model_load_seconds = time.perf_counter() - start
+                self._loaded = True
+
+    def _truncate(self, embedding: np.ndarray) -> np.ndarray:
+        return embedding[: self.dimensions].astype(np.float32)
+
+    def warm_up(self) -> None:
+        """Load the model and run one query so the first real query is fast."""
+        self._ensure_model()
+        self._backend.embed([f"{self._spec.query_prefix}warm up"], batch_size=1)
+
+    def start_warm_up(self) -> threading.Thread:
+        """Warm up in a daemon thread, leaving the caller (the MCP handshake) unblocked."""
+        thread = threading.Thread(
+            target=self._warm_up_quietly, name="embedder-warm-up", daemon=True
+        )
+        thread.start()
+        return thread
 
-            self._model = TextEmbedding(model_name=self.MODEL_NAME)
+    def _warm_up_quietly(self) -> None:
+        try:
+            self.warm_up()
+        except Exception:
+            pass  # The first query retries the load and surfaces the error
 
-    def embed_documents(self, texts: list[str]) -> list[np.ndarray]:
-        """Embed document texts with 'search_document:' prefix."""
+    def get_stats(self) -> dict:
+        """Model load time and inference counters since the process started."""
+        return {
+            "model": self.model_name,
+            "dimensions": self.dimensions,
+            "model_loaded": self._loaded,
+            "model_load_seconds": self._model_load_seconds,
+            "queries": self._queries,
+            "query_cache_hits": self._query_cache_hits,
+            "query_inference_seconds": self._query_seconds,
+            "documents_embedded": self._documents,
+            "document_inference_seconds": self._document_seconds,
+        }
+
+    def embed_documents(
+        self, texts: list[str], batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> list[np.ndarray]:
+        """Embed document texts with the model's document prefix.
+
+        Texts already in the shared cache skip the model entirely.
+        """
         if not texts:
             return []
+        if self._cache is None:
+            return self._run_documents(texts, batch_size)
+
+        hashes = [text_hash(t) for t in texts]
+        cached = self._cache.get_many(hashes, self.model_name, self.dimensions)
+        missing = {h: t for h, t in zip(hashes, texts) if h not in cached}
+        if missing:
+            fresh = dict(zip(missing, self._run_documents(list(missing.values()), batch_size)))
+            self._cache.put_many(fresh, self.model_name, self.dimensions)
+            cached.update(fresh)
+        return [cached[h] for h in hashes]
+
+    def _run_documents(self, texts: list[str], batch_size: int) -> list[np.ndarray]:
         self._ensure_model()
-        prefixed = [f"search_document: {t}" for t in texts]
-        embeddings = list(self._model.embed(prefixed))
-        return [e[: self.DIMENSIONS].astype(np.float32) for e in embeddings]
+        start = time.perf_counter()
+        prefixed = [f"{self._spec.document_prefix}{t}" for t in texts]
+        embeddings = self._backend.embed(prefixed, batch_size=batch_size)
+        self._document_seconds += time.perf_counter() - start
+        self._documents += len(texts)
+        return [self._truncate(e) for e in embeddings]
 
     def embed_query(self, query: str) -> np.ndarray:
-        """Embed a search query with 'search_query:' prefix."""
+        """Embed a search query with the model's query prefix.
+
+        Recent queries are answered from an in-memory LRU cache.
+        """
+        self._queries += 1
+        cached = self._query_cache.get(query)
+        if cached is not None:
+            self._query_cache.move_to_end(query)
+            self._query_cache_hits += 1
+            return cached
+
         self._ensure_model()
-        prefixed = [f"search_query: {query}"]
-        embeddings = list(self._model.embed(prefixed))
-        return embeddings[0][: self.DIMENSIONS].astype(np.float32)
+        start = time.perf_counter()
+        embeddings = self._backend.embed([f"{self._spec.query_prefix}{query}"], batch_size=1)
+        self._query_seconds += time.perf_counter() - start
+        embedding = self._truncate(embeddings[0])
+        embedding.setflags(write=False)  # Shared by later cache hits
+
+        if self._query_cache_size > 0:
+            self._query_cache[query] = embedding
+            if len(self._query_cache) > self._query_cache_size:
+                self._query_cache.popitem(last=False)
+        return embedding
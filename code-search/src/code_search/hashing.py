@@ -0,0 +1,12 @@
+"""Content hashes for change detection and embedding reuse."""
+
+import hashlib
+
+
+def content_hash(data: bytes) -> str:
+    """128-bit BLAKE2b hex digest."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def text_hash(text: str) -> str:
+    return content_hash(text.encode("utf-8"))
@@ -0,0 +1,355 @@
+"""Resident, pre-normalized embedding matrix for fast similarity queries."""
+
+from collections.abc import Callable
+from pathlib import Path
+
+import numpy as np
+
+from code_search.ivf import IVFIndex
+from code_search.quantize import quantize_binary, quantize_int8
+from code_search.search import blocked_top_k, hamming_top_k, rerank, top_k
+from code_search.store import CodeSearchStore
+
+INITIAL_CAPACITY = 1024
+BLOCKED_SEARCH_THRESHOLD = 100_000  # Above this many rows, score in blocks
+ANN_MIN_VECTORS = 50_000  # Below this, exact search is fast enough
+DEFAULT_NPROBE = 32
+RETRAIN_GROWTH = 2.0  # Retrain IVF centroids once the index doubles
+QUANTIZATIONS = ("none", "int8", "binary")
+# Quantized first pass keeps limit * factor candidates for exact re-ranking
+RERANK_FACTORS = {"int8": 4, "binary": 32}
+QUANTIZED_BLOCK_SIZE = 4096  # int8 rows widened to float32 per block
+
+
+class EmbeddingIndex:
+    """Contiguous matrix of unit vectors with a parallel id array.
+
+    Built once per server process and updated incrementally as chunks are
+    inserted or deleted, so a query is a single matrix-vector product;
+    sync() picks up chunks written by other processes sharing the database.
+    Large indexes also carry an IVF partition (persisted at `ann_path`) so
+    queries can scan only the closest lists.
+
+    With `quantization="int8"` (per-vector scale) or `"binary"` (sign bits)
+    the resident matrix is 4x or 32x smaller. The quantized scan picks a
+    shortlist that is re-ranked exactly against float vectors fetched from
+    `float_source` (chunk ids -> mask of ids found, their raw embeddings).
+    """
+
+    def __init__(
+        self,
+        dimensions: int,
+        ann_path: Path | None = None,
+        quantization: str = "none",
+        float_source: Callable[[np.ndarray], tuple[np.ndarray, np.ndarray]] | None = None,
+    ):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(
+                f"Unknown quantization {quantization!r}; expected one of {QUANTIZATIONS}"
+            )
+        if quantization != "none" and float_source is None:
+            raise ValueError("Quantized indexes need a float_source for re-ranking")
+        self._dimensions = dimensions
+        self._quantization = quantization
+        self._float_source = float_source
+        self._codes = self._empty_codes(INITIAL_CAPACITY)
+        self._scales = np.empty(INITIAL_CAPACITY, dtype=np.float32)
+        self._ids = np.empty(INITIAL_CAPACITY, dtype=np.int64)
+        self._lists = np.empty(INITIAL_CAPACITY, dtype=np.int32)
+        self._row_of: dict[int, int] = {}
+        self._size = 0
+        self._ann_path = ann_path
+        self._ivf: IVFIndex | None = None
+        # The store's data version and (ids, sidecar rows) as of the last sync
+        self._data_version: int | None = None
+        self._synced = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+
+    @classmethod
+    def from_store(
+        cls,
+        store: CodeSearchStore,
+        dimensions: int,
+        quantization: str = "none",
+        train: bool = True,
+    ) -> "EmbeddingIndex":
+        """Build an index from every chunk currently in the store.
+
+        With `train=False` a missing or outgrown IVF partition is left for the
+        caller to train (see train_ann); searches are exact until then.
+        """
+        index = cls(
+            dimensions,
+            ann_path=store.db_path.with_suffix(".ivf.npz"),
+            quantization=quantization,
+            float_source=store.get_embeddings_by_ids,
+        )
+        # Snapshot first: a write landing before the load is just fetched again
+        index._data_version = store.data_version()
+        index._synced = store.get_vector_rows()
+        ids, embeddings = store.get_all_embeddings()
+        index.add(ids, embeddings)
+        index._load_ann()
+        if train and index.needs_training():
+            index.refresh_ann()
+        return index
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def ids(self) -> np.ndarray:
+        """Chunk ids parallel to the resident rows."""
+        return self._ids[: self._size]
+
+    @property
+    def nbytes(self) -> int:
+        """Resident size of the vector codes."""
+        return self._codes[: self._size].nbytes
+
+    def _empty_codes(self, capacity: int) -> np.ndarray:
+        if self._quantization == "int8":
+            return np.empty((capacity, self._dimensions), dtype=np.int8)
+        if self._quantization == "binary":
+            return np.empty((capacity, (self._dimensions + 7) // 8), dtype=np.uint8)
+        return np.empty((capacity, self._dimensions), dtype=np.float32)
+
+    def _float_rows(self, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Unit-norm float32 vectors for the given rows, as (rows, vectors).
+
+        Quantized indexes fetch them from the store, which skips chunks that
+        another process has deleted since; those rows are left out.
+        """
+        if self._quantization == "none":
+            return rows, self._codes[rows]
+        found, vectors = self._float_source(self._ids[rows])
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self._dimensions)
+        return rows[found], vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-10)
+
+    def _reserve(self, capacity: int) -> None:
+        if capacity <= len(self._ids):
+            return
+        new_capacity = max(capacity, 2 * len(self._ids))
+        codes = self._empty_codes(new_capacity)
+        codes[: self._size] = self._codes[: self._size]
+        scales = np.empty(new_capacity, dtype=np.float32)
+        scales[: self._size] = self._scales[: self._size]
+        ids = np.empty(new_capacity, dtype=np.int64)
+        ids[: self._size] = self._ids[: self._size]
+        lists = np.empty(new_capacity, dtype=np.int32)
+        lists[: self._size] = self._lists[: self._size]
+        self._codes = codes
+        self._scales = scales
+        self._ids = ids
+        self._lists = lists
+
+    def add(self, ids: list[int] | np.ndarray, embeddings: np.ndarray | list[np.ndarray]) -> None:
+        """Append embeddings for newly inserted chunk ids."""
+        if len(ids) == 0:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        vectors = vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-10)
+
+        start = self._size
+        end = start + len(ids)
+        self._reserve(end)
+        if self._quantization == "int8":
+            self._codes[start:end], self._scales[start:end] = quantize_int8(vectors)
+        elif self._quantization == "binary":
+            self._codes[start:end] = quantize_binary(vectors)
+        else:
+            self._codes[start:end] = vectors
+        self._ids[start:end] = ids
+        for offset, chunk_id in enumerate(ids):
+            self._row_of[int(chunk_id)] = start + offset
+        if self._ivf is not None:
+            self._lists[start:end] = self._ivf.assign(vectors)
+        self._size = end
+
+    def remove(self, ids: list[int]) -> None:
+        """Drop rows for deleted chunk ids, keeping the matrix contiguous."""
+        for chunk_id in ids:
+            row = self._row_of.pop(int(chunk_id), None)
+            if row is None:
+                continue
+            last = self._size - 1
+            if row != last:
+                # Move the last row into the hole
+                moved_id = int(self._ids[last])
+                self._codes[row] = self._codes[last]
+                self._scales[row] = self._scales[last]
+                self._ids[row] = moved_id
+                self._lists[row] = self._lists[last]
+                self._row_of[moved_id] = row
+            self._size = last
+
+    def sync(self, store: CodeSearchStore) -> bool:
+        """Catch up with chunks other connections wrote since the last sync.
+
+        Costs one PRAGMA when nothing changed. Otherwise the store's
+        (id, sidecar row) pairs are compared with the previous snapshot:
+        rows gone from the store are dropped, and new or re-embedded ones
+        are loaded from the sidecar. Returns True if the store had changed.
+        """
+        version = store.data_version()
+        if version == self._data_version:
+            return False
+        self._data_version = version
+        ids, vec_rows = store.get_vector_rows()
+        old_ids, old_rows = self._synced
+        self._synced = ids, vec_rows
+
+        unchanged = np.zeros(len(ids), dtype=bool)
+        if len(old_ids):
+            positions = np.searchsorted(old_ids, ids).clip(max=len(old_ids) - 1)
+            unchanged = (old_ids[positions] == ids) & (old_rows[positions] == vec_rows)
+        # Rows this process wrote itself are not in the snapshot, so they are
+        # reloaded too; that only costs a read
+        self.remove(self.ids[~np.isin(self.ids, ids[unchanged])].tolist())
+        fresh = ids[~unchanged]
+        if len(fresh):
+            found, embeddings = store.get_embeddings_by_ids(fresh)
+            self.add(fresh[found], embeddings)
+        return True
+
+    def _load_ann(self) -> None:
+        """Restore a persisted IVF partition, assigning any chunks it lacks."""
+        if self._ann_path is None or self._size < ANN_MIN_VECTORS:
+            return
+        loaded = IVFIndex.load(self._ann_path)
+        if loaded is None:
+            return
+        ivf, assignments = loaded
+        if ivf.centroids.shape[1] != self._dimensions:
+            return
+
+        lists = np.array(
+            [assignments.get(int(i), -1) for i in self.ids], dtype=np.int32
+        )
+        if np.count_nonzero(lists < 0) > len(lists) // 2:
+            return  # Mostly other chunks: stale (e.g. re-embedded), so retrain
+        self._assign_missing(ivf, lists)
+        self._lists[: self._size] = lists
+        self._ivf = ivf
+
+    def _assign_missing(self, ivf: IVFIndex, lists: np.ndarray) -> None:
+        """Fill rows of `lists` without a list (-1) with their nearest list in `ivf`."""
+        missing = np.flatnonzero(lists < 0)
+        if len(missing):
+            found, vectors = self._float_rows(missing)
+            lists[found] = ivf.assign(vectors)
+
+    def needs_training(self) -> bool:
+        """Whether the index is big enough for IVF and has no partition, or outgrew it."""
+        return self._size >= ANN_MIN_VECTORS and (
+            self._ivf is None or self._size >= RETRAIN_GROWTH * self._ivf.trained_size
+        )
+
+    def install_ann(self, ivf: IVFIndex, ids: np.ndarray, lists: np.ndarray) -> None:
+        """Switch to a partition from train_ann, trained on a snapshot of the store.
+
+        Chunks added since the snapshot are assigned here. The centroids and
+        every row's list are replaced together, with no await in between, so
+        a query sees either the old partition or the new one.
+        """
+        if self._size < ANN_MIN_VECTORS or not len(ids):
+            return
+        current = self.ids
+        positions = np.searchsorted(ids, current).clip(max=len(ids) - 1)
+        rows_lists = np.where(ids[positions] == current, lists[positions], -1).astype(np.int32)
+        self._assign_missing(ivf, rows_lists)
+        self._lists[: self._size] = rows_lists
+        self._ivf = ivf
+        if self._ann_path is not None:
+            self._ivf.save(self._ann_path, self.ids, self._lists[: self._size])
+
+    def refresh_ann(self) -> None:
+        """Train, retrain or drop the IVF partition to match the index size.
+
+        New chunks are assigned to existing lists as they are added; the
+        centroids are only retrained once the index has grown substantially.
+        """
+        if self._size < ANN_MIN_VECTORS:
+            self._ivf = None
+            if self._ann_path is not None:
+                self._ann_path.unlink(missing_ok=True)
+            return
+
+        if self.needs_training():
+            found, vectors = self._float_rows(np.arange(self._size))
+            self._ivf = IVFIndex.train(vectors)
+            self._lists[: self._size] = -1  # Deleted by another process: never probed
+            self._lists[found] = self._ivf.assign(vectors)
+
+        if self._ann_path is not None:
+            self._ivf.save(self._ann_path, self.ids, self._lists[: self._size])
+
+    def search(
+        self,
+        query_embedding: np.ndarray,
+        limit: int = 10,
+        nprobe: int | None = None,
+    ) -> list[tuple[int, float]]:
+        """Return (chunk_id, cosine score) pairs, best first.
+
+        On large indexes only the `nprobe` closest IVF lists are scanned
+        (default DEFAULT_NPROBE); `nprobe=0` forces an exact scan.
+        """
+        if self._size == 0:
+            return []
+
+        query = query_embedding.astype(np.float32)
+        query = query / (np.linalg.norm(query) + 1e-10)
+
+        rows = None
+        if self._ivf is not None and nprobe != 0:
+            probes = self._ivf.probe(query, nprobe or DEFAULT_NPROBE)
+            rows = np.flatnonzero(np.isin(self._lists[: self._size], probes))
+
+        if self._quantization != "none":
+            shortlist = self._shortlist(query, limit * RERANK_FACTORS[self._quantization], rows)
+            shortlist, vectors = self._float_rows(shortlist)
+            order, scores = rerank(query, vectors, limit)
+            return [(int(self._ids[shortlist[i]]), float(s)) for i, s in zip(order, scores)]
+
+        if rows is not None:
+            scores = self._codes[rows] @ query
+            top_indices = top_k(scores, limit)
+            return [(int(self._ids[rows[i]]), float(scores[i])) for i in top_indices]
+
+        matrix = self._codes[: self._size]
+        if self._size > BLOCKED_SEARCH_THRESHOLD:
+            rows, scores = blocked_top_k(matrix, query, limit)
+            return [(int(self._ids[r]), float(s)) for r, s in zip(rows, scores)]
+
+        scores = matrix @ query
+        top_indices = top_k(scores, limit)
+        return [(int(self._ids[i]), float(scores[i])) for i in top_indices]
+
+    def _shortlist(self, query: np.ndarray, k: int, rows: np.ndarray | None) -> np.ndarray:
+        """First pass over quantized codes: the k most promising rows."""
+        if rows is None:
+            codes, scales = self._codes[: self._size], self._scales[: self._size]
+        else:
+            codes, scales = self._codes[rows], self._scales[rows]
+        if self._quantization == "binary":
+            query_bits = quantize_binary(query.reshape(1, -1))[0]
+            best = hamming_top_k(codes, query_bits, k)
+        else:
+            best, _ = blocked_top_k(codes, query, k, QUANTIZED_BLOCK_SIZE, scales=scales)
+        return best if rows is None else rows[best]
+
+
+def train_ann(
+    ids: np.ndarray, embeddings: np.ndarray
+) -> tuple[IVFIndex, np.ndarray, np.ndarray]:
+    """Train an IVF partition on raw embeddings, e.g. from store.get_all_embeddings().
+
+    Returns (partition, ids sorted, their lists) for EmbeddingIndex.install_ann.
+    Only touches its arguments, so it can run in a worker thread while the
+    index keeps answering queries.
+    """
+    vectors = embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-10)
+    ivf = IVFIndex.train(vectors)
+    lists = ivf.assign(vectors)
+    order = np.argsort(ids)
+    return ivf, ids[order], lists[order]
@@ -0,0 +1,446 @@
+"""Indexing pipeline: chunk files, embed across files in batches, write to the store.
+
+The three stages overlap: files are chunked ahead in a process pool, one
+batch embeds in a worker thread while the next batch is being collected,
+and SQLite writes happen on the event loop thread between batches.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+from code_search.chunker import ChunkDiff, CodeChunk, chunk_file, diff_chunks
+from code_search.embedder import DEFAULT_BATCH_SIZE, Embedder
+from code_search.hashing import content_hash, text_hash
+from code_search.index import EmbeddingIndex
+from code_search.store import CodeSearchStore
+
+FILES_PER_COMMIT = 64  # Files written per store transaction
+DEFAULT_CHUNK_WORKERS = min(4, os.cpu_count() or 1)
+PARALLEL_CHUNK_MIN_FILES = 32  # Smaller jobs chunk in a thread, skipping pool startup
+CHUNK_PREFETCH_PER_WORKER = 4  # In-flight chunking tasks per worker
+SCAN_PROGRESS_INTERVAL = 1000  # Files mtime-checked between progress reports and yields
+
+
+@dataclass
+class _PendingFile:
+    file_path: str
+    mtime: float
+    file_hash: str | None
+    chunks: list[CodeChunk] | None  # None: content unchanged, only the mtime moved
+    diff: ChunkDiff | None = None  # Against the chunks already stored for the file
+    embeddings: list[np.ndarray | None] = field(default_factory=list)
+    descriptions: list[str | None] = field(default_factory=list)
+
+    @property
+    def fresh(self) -> list[int]:
+        """Indexes of the chunks that need an embedding: changed or added ones."""
+        if self.diff is None:
+            return list(range(len(self.chunks or [])))
+        return [i for _, i in self.diff.changed] + self.diff.added
+
+
+@dataclass
+class IndexResult:
+    chunks: int = 0
+    chunks_reused: int = 0  # Embeddings reused from identical stored chunks
+    chunks_unchanged: int = 0  # Chunks of changed files left as they were stored
+    files_indexed: int = 0
+    files_skipped: int = 0
+
+
+@dataclass
+class IndexProgress:
+    phase: str  # "scanning" (checking mtimes) or "indexing"
+    files_done: int
+    files_total: int | None  # None while scanning
+    chunks_done: int
+    elapsed: float  # Seconds since the indexing phase started
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks_done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> float | None:
+        """Seconds left, extrapolated from the file rate so far."""
+        if not self.files_total or not self.files_done or self.elapsed <= 0:
+            return None
+        return (self.files_total - self.files_done) * self.elapsed / self.files_done
+
+
+ProgressCallback = Callable[[IndexProgress], Awaitable[None]]
+
+
+class _FileClaims:
+    """Files a batch has diffed against the store but not yet written.
+
+    Shared by every Indexer in the process (load_code jobs, the watcher), so
+    two overlapping index_files calls never both diff a file against the
+    same stored chunks and then both apply their diff. A batch waits, holding
+    no claims of its own, until none of its files is claimed.
+    """
+
+    def __init__(self):
+        self._owners: dict[str, asyncio.Future] = {}
+
+    async def claim(self, files: list[str]) -> None:
+        while True:
+            busy = next((self._owners[f] for f in files if f in self._owners), None)
+            if busy is None:
+                break
+            # wait() rather than await, so a cancelled waiter leaves the future alone
+            await asyncio.wait([busy])
+        released = asyncio.get_running_loop().create_future()
+        for file_path in files:
+            self._owners[file_path] = released
+
+    def release(self, files: list[str]) -> None:
+        for file_path in files:
+            released = self._owners.pop(file_path, None)
+            if released is not None and not released.done():
+                released.set_result(None)
+
+
+_claims = _FileClaims()
+
+
+def _load_file(file_path: str, known_hash: str | None) -> tuple[str | None, list[CodeChunk] | None]:
+    """Hash a file and chunk it unless the hash matches `known_hash`.
+
+    Runs in chunking workers. Returns (hash, chunks), with chunks None when
+    the content is unchanged.
+    """
+    try:
+        file_hash = content_hash(Path(file_path).read_bytes())
+    except OSError:
+        return None, []
+    if file_hash == known_hash:
+        return file_hash, None
+    return file_hash, chunk_file(file_path)
+
+
+class Indexer:
+    """Re-indexes changed files, batching embedding work across files.
+
+    Chunks from many small files are pooled until at least `batch_size`
+    texts are waiting, then embedded together (sorted by length so each
+    model batch pads little) and scattered back to their files.
+    """
+
+    def __init__(
+        self,
+        store: CodeSearchStore,
+        index: EmbeddingIndex,
+        embedder: Embedder,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        chunk_workers: int = DEFAULT_CHUNK_WORKERS,
+    ):
+        self._store = store
+        self._index = index
+        self._embedder = embedder
+        self._batch_size = batch_size
+        self._chunk_workers = chunk_workers
+        self._progress: ProgressCallback | None = None
+        self._started = 0.0
+        self._files_total = 0
+        self._files_done = 0
+        self._chunks_done = 0
+
+    @property
+    def files_written(self) -> int:
+        """Files committed so far; accurate even if index_files was interrupted."""
+        return self._files_done
+
+    async def index_files(
+        self,
+        files: Iterable[str],
+        generate_descriptions: bool = False,
+        progress: ProgressCallback | None = None,
+    ) -> IndexResult:
+        """Index new and changed files, committing every few files.
+
+        Each batch is committed as soon as it is embedded, so an interrupted
+        run keeps its work: the next run skips those files by mtime.
+        """
+        result = IndexResult()
+        self._progress = progress
+
+        # mtime is the cheap first check; the content hash decides in the workers
+        changed: list[tuple[str, float, str | None]] = []
+        # Overlapping paths (a directory and one inside it) list a file twice;
+        # nothing is committed until after the scan, so both copies would pass
+        seen: set[str] = set()
+        for scanned, file_path in enumerate(files, 1):
+            if scanned % SCAN_PROGRESS_INTERVAL == 0:
+                if progress is not None:
+                    await progress(IndexProgress("scanning", scanned, None, 0, 0.0))
+                await asyncio.sleep(0)  # Let queries run during long scans
+            if file_path in seen:
+                continue
+            seen.add(file_path)
+            try:
+                current_mtime = os.path.getmtime(file_path)
+            except OSError:
+                continue
+
+            record = self._store.get_file_record(file_path)
+            if record is not None and record[0] >= current_mtime:
+                result.files_skipped += 1
+                continue
+            changed.append((file_path, current_mtime, record[1] if record else None))
+
+        self._files_total = len(changed)
+        self._started = time.perf_counter()
+        await self._report()
+
+        pending: list[_PendingFile] = []
+        pending_chunks = 0
+        # The previous batch, embedding in the background while we collect this one
+        in_flight: tuple[list[_PendingFile], asyncio.Task] | None = None
+        claimed: list[str] = []  # Files of batches diffed but not yet committed
+
+        try:
+            async for entry in self._chunk_stream(changed):
+                # Files with no chunks are still written, to drop stale rows
+                pending.append(entry)
+                if entry.chunks is None:
+                    result.files_skipped += 1
+                elif entry.chunks:
+                    pending_chunks += len(entry.chunks)
+                    result.chunks += len(entry.chunks)
+                    result.files_indexed += 1
+
+                if pending_chunks >= self._batch_size or len(pending) >= FILES_PER_COMMIT:
+                    if in_flight is not None:
+                        await in_flight[1]
+                        await self._commit(in_flight[0])
+                        _claims.release(claimed)
+                        claimed = []
+                    batch_files = [entry.file_path for entry in pending]
+                    await _claims.claim(batch_files)
+                    claimed = batch_files
+                    result.chunks_unchanged += self._diff(pending)
+                    result.chunks_reused += self._reuse_embeddings(pending)
+                    task = asyncio.create_task(self._prepare(pending, generate_descriptions))
+                    in_flight = (pending, task)
+                    pending = []
+                    pending_chunks = 0
+
+            if in_flight is not None:
+                await in_flight[1]
+                await self._commit(in_flight[0])
+                in_flight = None
+                _claims.release(claimed)
+                claimed = []
+            if pending:
+                batch_files = [entry.file_path for entry in pending]
+                await _claims.claim(batch_files)
+                claimed = batch_files
+                result.chunks_unchanged += self._diff(pending)
+                result.chunks_reused += self._reuse_embeddings(pending)
+                await self._prepare(pending, generate_descriptions)
+                await self._commit(pending)
+        finally:
+            if in_flight is not None:
+                in_flight[1].cancel()
+            _claims.release(claimed)
+        return result
+
+    def remove_files(self, files: list[str]) -> int:
+        """Drop deleted files from the store and the resident index.
+
+        Returns the number of chunks removed.
+        """
+        removed: list[int] = []
+        with self._store.batch():
+            for file_path in files:
+                removed.extend(self._store.get_file_chunk_ids(file_path))
+                self._store.delete_file_chunks(file_path)
+        self._index.remove(removed)
+        return len(removed)
+
+    def _chunk_executor(self, n_files: int) -> Executor | None:
+        """A process pool for large jobs; None means the default thread pool."""
+        if self._chunk_workers <= 1 or n_files < PARALLEL_CHUNK_MIN_FILES:
+            return None
+        return ProcessPoolExecutor(
+            max_workers=self._chunk_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    async def _chunk_stream(
+        self, changed: list[tuple[str, float, str | None]]
+    ) -> AsyncIterator[_PendingFile]:
+        """Yield chunked files in order, keeping a bounded window chunking ahead."""
+        loop = asyncio.get_running_loop()
+        executor = self._chunk_executor(len(changed))
+        window = max(1, self._chunk_workers) * CHUNK_PREFETCH_PER_WORKER
+        in_flight: deque[tuple[str, float, asyncio.Future]] = deque()
+        remaining = iter(changed)
+        try:
+            while True:
+                while len(in_flight) < window:
+                    item = next(remaining, None)
+                    if item is None:
+                        break
+                    file_path, mtime, known_hash = item
+                    future = loop.run_in_executor(executor, _load_file, file_path, known_hash)
+                    in_flight.append((file_path, mtime, future))
+                if not in_flight:
+                    return
+                file_path, mtime, future = in_flight.popleft()
+                file_hash, chunks = await future
+                yield _PendingFile(file_path, mtime, file_hash, chunks)
+        finally:
+            for _, _, future in in_flight:
+                future.cancel()
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def _diff(self, pending: list[_PendingFile]) -> int:
+        """Match each file's new chunks against its stored ones.
+
+        Runs on the event loop thread (it reads SQLite). Returns the number of
+        chunks kept as they are.
+        """
+        kept = 0
+        for entry in pending:
+            if entry.chunks is None:
+                continue
+            previous = self._store.get_file_chunk_keys(entry.file_path)
+            if previous:
+                entry.diff = diff_chunks(previous, entry.chunks)
+                kept += len(entry.diff.kept)
+        return kept
+
+    def _reuse_embeddings(self, pending: list[_PendingFile]) -> int:
+        """Fill in embeddings for fresh chunks whose exact source is already stored.
+
+        Runs on the event loop thread (it reads SQLite). Returns the count reused.
+        """
+        for entry in pending:
+            entry.embeddings = [None] * len(entry.chunks or [])
+        hashes = [
+            {i: text_hash(entry.chunks[i].source_code) for i in entry.fresh}
+            for entry in pending
+        ]
+        known = self._store.get_embeddings_by_chunk_hashes(
+            [h for file_hashes in hashes for h in file_hashes.values()]
+        )
+        reused = 0
+        for entry, file_hashes in zip(pending, hashes):
+            for i, h in file_hashes.items():
+                if h in known:
+                    entry.embeddings[i] = known[h]
+                    reused += 1
+        return reused
+
+    def _embed(self, pending: list[_PendingFile]) -> None:
+        """Embed fresh chunks lacking a reused embedding, in length-sorted batches."""
+        owners = [
+            (entry, i)
+            for entry in pending
+            for i in entry.fresh
+            if entry.embeddings[i] is None
+        ]
+        if not owners:
+            return
+        owners.sort(key=lambda owner: len(owner[0].chunks[owner[1]].source_code))
+        texts = [entry.chunks[i].source_code for entry, i in owners]
+        embeddings = self._embedder.embed_documents(texts, batch_size=self._batch_size)
+        for (entry, i), embedding in zip(owners, embeddings):
+            entry.embeddings[i] = embedding
+
+    async def _describe(self, entry: _PendingFile) -> None:
+        fresh = entry.fresh
+        try:
+            from code_search.describer import describe_chunks
+            descriptions = await describe_chunks(
+                [entry.chunks[i] for i in fresh], entry.file_path
+            )
+            for i, description in zip(fresh, descriptions):
+                entry.descriptions[i] = description
+        except Exception:
+            pass  # Graceful failure, chunks still indexed without descriptions
+
+    async def _prepare(self, pending: list[_PendingFile], generate_descriptions: bool) -> None:
+        """Embed (off the event loop) and optionally describe a batch of files."""
+        await asyncio.to_thread(self._embed, pending)
+        for entry in pending:
+            entry.descriptions = [None] * len(entry.chunks or [])
+            if generate_descriptions and entry.fresh:
+                await self._describe(entry)
+
+    async def _commit(self, pending: list[_PendingFile]) -> None:
+        self._write(pending)
+        self._files_done += len(pending)
+        self._chunks_done += sum(len(entry.fresh) for entry in pending if entry.chunks)
+        await self._report()
+
+    async def _report(self) -> None:
+        if self._progress is not None:
+            await self._progress(
+                IndexProgress(
+                    "indexing",
+                    self._files_done,
+                    self._files_total,
+                    self._chunks_done,
+                    time.perf_counter() - self._started,
+                )
+            )
+
+    def _write(self, pending: list[_PendingFile]) -> None:
+        """Commit a prepared batch of files in one transaction.
+
+        Files with stored chunks only have their changed, added and removed
+        rows rewritten; new files are bulk-inserted.
+        """
+        removed: list[int] = []
+        added: list[tuple[list[int], list[np.ndarray]]] = []
+        with self._store.batch():
+            for entry in pending:
+                if entry.chunks is None:
+                    self._store.touch_file(entry.file_path, entry.mtime)
+                    continue
+                if entry.diff is None:
+                    removed.extend(self._store.get_file_chunk_ids(entry.file_path))
+                    chunk_ids = self._store.replace_file_chunks(
+                        entry.file_path,
+                        entry.mtime,
+                        entry.chunks,
+                        entry.embeddings,
+                        entry.descriptions,
+                        file_hash=entry.file_hash,
+                    )
+                    added.append((chunk_ids, entry.embeddings))
+                    continue
+                chunk_ids = self._store.update_file_chunks(
+                    entry.file_path,
+                    entry.mtime,
+                    entry.chunks,
+                    entry.diff,
+                    entry.embeddings,
+                    entry.descriptions,
+                    file_hash=entry.file_hash,
+                )
+                # Changed chunks keep their ids but get a new vector
+                removed.extend(entry.diff.removed)
+                removed.extend(chunk_id for chunk_id, _ in entry.diff.changed)
+                fresh = entry.fresh
+                added.append(
+                    ([chunk_ids[i] for i in fresh], [entry.embeddings[i] for i in fresh])
+                )
+
+        # Only touch the resident index once the transaction has committed
+        self._index.remove(removed)
+        for chunk_ids, embeddings in added:
+            self._index.add(chunk_ids, embeddings)
@@ -0,0 +1,90 @@
+"""Inverted-file (IVF) approximate nearest-neighbour index.
+
+Spherical k-means partitions the unit embedding vectors into lists; a query
+only scores the vectors in the `nprobe` lists whose centroids are closest.
+"""
+
+import zipfile
+from pathlib import Path
+
+import numpy as np
+
+KMEANS_ITERATIONS = 10
+SAMPLES_PER_LIST = 64  # Training sample size per centroid
+ASSIGN_BLOCK_SIZE = 16384
+
+
+class IVFIndex:
+    """Coarse quantizer: unit-norm centroids over the embedding space."""
+
+    def __init__(self, centroids: np.ndarray, trained_size: int):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.trained_size = trained_size
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, seed: int = 0) -> "IVFIndex":
+        """Run spherical k-means over a sample of unit-norm `vectors`.
+
+        Uses about sqrt(n) lists, the usual balance between centroid scoring
+        and list scanning cost.
+        """
+        n = len(vectors)
+        n_lists = max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+
+        sample_size = min(n, n_lists * SAMPLES_PER_LIST)
+        sample = vectors[rng.choice(n, size=sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, size=n_lists, replace=False)].copy()
+
+        for _ in range(KMEANS_ITERATIONS):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Empty lists keep their previous centroid
+            filled = norms[:, 0] > 0
+            centroids[filled] = sums[filled] / norms[filled]
+
+        return cls(centroids, trained_size=n)
+
+    def assign(self, vectors: np.ndarray) -> np.ndarray:
+        """Nearest list for each unit-norm vector."""
+        lists = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), ASSIGN_BLOCK_SIZE):
+            block = vectors[start : start + ASSIGN_BLOCK_SIZE]
+            lists[start : start + len(block)] = np.argmax(block @ self.centroids.T, axis=1)
+        return lists
+
+    def probe(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Lists whose centroids are closest to the query."""
+        nprobe = min(nprobe, self.n_lists)
+        scores = self.centroids @ query
+        return np.argpartition(scores, self.n_lists - nprobe)[self.n_lists - nprobe :]
+
+    def save(self, path: Path, ids: np.ndarray, lists: np.ndarray) -> None:
+        """Persist centroids and per-chunk list assignments."""
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                trained_size=np.int64(self.trained_size),
+                ids=ids,
+                lists=lists,
+            )
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> tuple["IVFIndex", dict[int, int]] | None:
+        """Load a saved index and its chunk id -> list mapping, if present."""
+        try:
+            with np.load(path) as data:
+                ivf = cls(data["centroids"], trained_size=int(data["trained_size"]))
+                assignments = dict(zip(data["ids"].tolist(), data["lists"].tolist()))
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            return None
+        return ivf, assignments
@@ -0,0 +1,126 @@
+"""Background job queue for load_code, so indexing never blocks a tool call."""
+
+import asyncio
+import itertools
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    # Imported lazily by the server; the indexer pulls in numpy
+    from code_search.indexer import IndexProgress, ProgressCallback
+
+MAX_FINISHED_JOBS = 50  # Finished jobs kept for index_status
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+@dataclass
+class IndexJob:
+    id: int
+    paths: list[str]
+    generate_descriptions: bool = False
+    tracked_only: bool = False
+    status: str = QUEUED
+    progress: "IndexProgress | None" = None
+    summary: str | None = None  # Result line once done, error text if failed
+    created: float = field(default_factory=time.time)
+    started: float | None = None
+    finished: float | None = None
+    on_progress: "ProgressCallback | None" = None  # Extra listener, e.g. a waiting tool call
+    _task: asyncio.Task | None = field(default=None, repr=False)
+    _done: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    async def wait(self) -> None:
+        await self._done.wait()
+
+
+# Runs one job: resolves and indexes its paths, reporting progress, and
+# returns the summary line
+JobRunner = Callable[[IndexJob, "ProgressCallback"], Awaitable[str]]
+
+
+class JobQueue:
+    """FIFO of indexing jobs drained by up to `concurrency` workers.
+
+    Workers start lazily on the first submit, inside the server's event loop.
+    """
+
+    def __init__(self, run: JobRunner, concurrency: int = 1):
+        self._run = run
+        self._concurrency = max(1, concurrency)
+        self._queue: asyncio.Queue[IndexJob] = asyncio.Queue()
+        self._jobs: dict[int, IndexJob] = {}
+        self._ids = itertools.count(1)
+        self._workers: list[asyncio.Task] = []
+
+    def submit(
+        self, paths: list[str], generate_descriptions: bool = False, tracked_only: bool = False
+    ) -> IndexJob:
+        job = IndexJob(next(self._ids), paths, generate_descriptions, tracked_only)
+        self._jobs[job.id] = job
+        self._queue.put_nowait(job)
+        if not self._workers:
+            self._workers = [
+                asyncio.create_task(self._worker()) for _ in range(self._concurrency)
+            ]
+        return job
+
+    def get(self, job_id: int) -> IndexJob | None:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> list[IndexJob]:
+        return list(self._jobs.values())
+
+    def cancel(self, job_id: int) -> bool:
+        """Cancel a queued or running job. Returns False if it already finished."""
+        job = self._jobs.get(job_id)
+        if job is None or job.finished is not None:
+            return False
+        if job._task is not None:
+            job._task.cancel()
+        else:
+            self._finish(job, CANCELLED, "Cancelled before it started.")
+        return True
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            if job.status != QUEUED:
+                continue  # Cancelled while waiting
+
+            async def report(progress: "IndexProgress", job: IndexJob = job) -> None:
+                job.progress = progress
+                if job.on_progress is not None:
+                    try:
+                        await job.on_progress(progress)
+                    except Exception:
+                        job.on_progress = None  # The listener went away; keep indexing
+
+            job.status = RUNNING
+            job.started = time.time()
+            job._task = asyncio.create_task(self._run(job, report))
+            # wait() rather than await, so cancelling the job leaves the worker running
+            await asyncio.wait([job._task])
+            if job._task.cancelled():
+                self._finish(job, CANCELLED, "Cancelled; rerun load_code to resume.")
+            elif (error := job._task.exception()) is not None:
+                self._finish(job, FAILED, f"{type(error).__name__}: {error}")
+            else:
+                self._finish(job, DONE, job._task.result())
+
+    def _finish(self, job: IndexJob, status: str, summary: str) -> None:
+        job.status = status
+        job.summary = summary
+        job.finished = time.time()
+        job._task = None
+        job._done.set()
+
+        finished = [j for j in self._jobs.values() if j.finished is not None]
+        for old in finished[:-MAX_FINISHED_JOBS]:
+            del self._jobs[old.id]
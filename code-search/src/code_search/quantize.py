@@ -0,0 +1,21 @@
+"""Scalar int8 and 1-bit sign quantization of embedding vectors."""
+
+import numpy as np
+
+
+def quantize_int8(vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Quantize each row to int8 with its own scale.
+
+    Returns (codes, scales) where `codes * scales[:, None]` approximates
+    `vectors`.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    """Pack the sign bit of each dimension; 32 bytes per 256-d vector."""
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
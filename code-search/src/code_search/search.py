@@ -1,34 +1,112 @@
-"""Cosine similarity search over stored chunks."""
+"""Top-k scoring for the resident index, and fusion with keyword search."""
+
+import heapq
+import re
 
 import numpy as np
 
 from code_search.store import StoredChunk
 
+BLOCK_SIZE = 16384  # Rows scored per block in blocked_top_k
+RRF_K = 60  # Reciprocal rank fusion damping; larger flattens the rank curve
+
+# snake_case, camelCase/PascalCase or dotted names: unlikely to be prose
+_IDENTIFIER = re.compile(
+    r"[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*"
+)
+_IDENTIFIER_HINT = re.compile(r"_|\.|[a-z][A-Z]|^[A-Z][a-z0-9]+[A-Z]")
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first.
+
+    Uses partial selection so only the k winners are sorted.
+    """
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.intp)
+    if k < n:
+        candidates = np.argpartition(scores, n - k)[n - k :]
+    else:
+        candidates = np.arange(n)
+    return candidates[np.argsort(scores[candidates])[::-1]]
+
+
+def blocked_top_k(
+    matrix: np.ndarray,
+    query: np.ndarray,
+    k: int,
+    block_size: int = BLOCK_SIZE,
+    scales: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Top-k rows of `matrix @ query`, scanning `block_size` rows at a time.
+
+    Keeps a running min-heap of the best k, so peak memory is one block of
+    scores regardless of how many rows the matrix (or memmap) has.
+    For int8 codes pass their per-row `scales`; each block is widened to
+    float32 only while it is being scored.
+    Returns (row indices, scores), best first.
+    """
+    heap: list[tuple[float, int]] = []
+    if k > 0:
+        for start in range(0, len(matrix), block_size):
+            block = matrix[start : start + block_size]
+            block_scores = block.astype(np.float32, copy=False) @ query
+            if scales is not None:
+                block_scores *= scales[start : start + block_size]
+            for i in top_k(block_scores, k):
+                item = (float(block_scores[i]), start + int(i))
+                if len(heap) < k:
+                    heapq.heappush(heap, item)
+                elif item[0] > heap[0][0]:
+                    heapq.heapreplace(heap, item)
+
+    best = sorted(heap, reverse=True)
+    rows = np.array([row for _, row in best], dtype=np.intp)
+    scores = np.array([score for score, _ in best], dtype=np.float32)
+    return rows, scores
+
+
+def hamming_top_k(codes: np.ndarray, query_bits: np.ndarray, k: int) -> np.ndarray:
+    """Rows of packed sign-bit `codes` closest to `query_bits`, best first."""
+    distances = _POPCOUNT[np.bitwise_xor(codes, query_bits)].sum(axis=1, dtype=np.int32)
+    return top_k(-distances, k)
+
+
+def rerank(
+    query: np.ndarray, vectors: np.ndarray, k: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Exact cosine re-rank of a shortlist of float vectors against a unit query.
 
-def cosine_similarity_search(
-    query_embedding: np.ndarray,
-    chunks: list[StoredChunk],
-    limit: int = 10,
-) -> list[tuple[StoredChunk, float]]:
-    """Search chunks by cosine similarity to query embedding."""
-    if not chunks:
-        return []
+    Returns (shortlist positions, scores), best first.
+    """
+    norms = np.linalg.norm(vectors, axis=1) + 1e-10
+    scores = (vectors @ query) / norms
+    order = top_k(scores, k)
+    return order, scores[order]
 
-    # Stack all embeddings into a matrix
-    embeddings = np.stack([c.embedding for c in chunks])
 
-    # Normalize
-    query_norm = query_embedding / (np.linalg.norm(query_embedding) + 1e-10)
-    embed_norms = np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-10
-    normalized = embeddings / embed_norms
+def is_identifier_query(query: str) -> bool:
+    """Whether `query` is a single code identifier such as `get_file_mtime`."""
+    query = query.strip().strip("`")
+    return bool(_IDENTIFIER.fullmatch(query) and _IDENTIFIER_HINT.search(query))
 
-    # Cosine similarity = dot product of normalized vectors
-    scores = normalized @ query_norm
 
-    # Sort by score descending
-    top_indices = np.argsort(scores)[::-1][:limit]
+def reciprocal_rank_fusion(
+    rankings: list[list[int]], k: int = RRF_K
+) -> list[tuple[int, float]]:
+    """Fuse ranked id lists by summing 1 / (k + rank) per id.
 
-    return [(chunks[i], float(scores[i])) for i in top_indices]
+    Rank-based, so cosine and BM25 scores need no common scale. Returns
+    (id, fused score) pairs, best first.
+    """
+    fused: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
 
 
 def format_results(results: list[tuple[StoredChunk, float]]) -> str:
@@ -1,161 +1,521 @@
 """FastMCP stdio server with load_code and prior_art_search tools."""
 
+import asyncio
 import os
+from collections.abc import Iterator
+from itertools import chain
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
 
-from code_search.chunker import chunk_file, is_indexable
-from code_search.embedder import Embedder
-from code_search.search import cosine_similarity_search, format_results
-from code_search.store import CodeSearchStore
+from code_search.backends import DEFAULT_DIMENSIONS, DEFAULT_MODEL
+from code_search.chunker import is_indexable
+from code_search.jobs import QUEUED, RUNNING, IndexJob, JobQueue
+from code_search.walker import is_excluded, tracked_files, walk_files
+from code_search.watcher import IndexWatcher
+
+# The server is spawned once per session, so modules that pull in numpy or
+# SQLite (store, index, embedder, indexer, search) are imported on first use
+# rather than ahead of the MCP handshake.
+if TYPE_CHECKING:
+    from code_search.embedder import Embedder
+    from code_search.index import EmbeddingIndex
+    from code_search.indexer import Indexer, IndexProgress, ProgressCallback
+    from code_search.store import CodeSearchStore
+
+
+def _optional_int_env(name: str) -> int | None:
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+
+# Settings left unset (None) take their module's default: DEFAULT_BATCH_SIZE,
+# DEFAULT_CHUNK_WORKERS, DEFAULT_MAX_ENTRIES and DEFAULT_QUERY_CACHE_SIZE
+
+# Texts per embedding batch, pooled across files during load_code
+EMBED_BATCH_SIZE = _optional_int_env("CODE_SEARCH_EMBED_BATCH_SIZE")
+
+# Processes used to chunk large load_code jobs
+CHUNK_WORKERS = _optional_int_env("CODE_SEARCH_CHUNK_WORKERS")
+
+# Shared embedding cache size in entries (~1 KB each); 0 disables it
+EMBED_CACHE_MAX_ENTRIES = _optional_int_env("CODE_SEARCH_EMBED_CACHE_MAX_ENTRIES")
+
+# Embedding model (see backends.MODELS) and output size; the size defaults
+# to 256 for Matryoshka models and to the native size for the others
+EMBED_MODEL = os.environ.get("CODE_SEARCH_EMBED_MODEL", DEFAULT_MODEL)
+EMBED_DIMENSIONS = _optional_int_env("CODE_SEARCH_EMBED_DIMENSIONS")
+
+# Runtime for the model, its ONNX intra-op threads per session (default: all
+# cores) and the worker processes large batches are split across
+EMBED_BACKEND = os.environ.get("CODE_SEARCH_EMBED_BACKEND", "fastembed")
+EMBED_THREADS = _optional_int_env("CODE_SEARCH_EMBED_THREADS")
+EMBED_PARALLEL = _optional_int_env("CODE_SEARCH_EMBED_PARALLEL")
+
+# Embed through a shared per-user daemon process (spawned on first use)
+# instead of loading the model in every server process
+EMBED_DAEMON = os.environ.get("CODE_SEARCH_EMBED_DAEMON", "0") == "1"
+
+# Recent query embeddings kept in memory; 0 disables the cache
+QUERY_CACHE_SIZE = _optional_int_env("CODE_SEARCH_QUERY_CACHE_SIZE")
+
+# Load the embedding model in the background at startup instead of on first use
+WARM_UP = os.environ.get("CODE_SEARCH_WARM_UP", "0") == "1"
+
+# Resident vector precision: "none" (float32), "int8" or "binary"
+QUANTIZATION = os.environ.get("CODE_SEARCH_QUANTIZATION", "none")
+
+# Candidates taken from each ranking before hybrid fusion, per requested result
+HYBRID_CANDIDATE_FACTOR = 3
+
+SEARCH_MODES = ("hybrid", "semantic", "keyword")
+
+# load_code jobs indexed at the same time; the rest wait in the queue
+INDEX_CONCURRENCY = int(os.environ.get("CODE_SEARCH_INDEX_CONCURRENCY", "1"))
+
+# Re-index files under load_code directories as they change on disk
+WATCH = os.environ.get("CODE_SEARCH_WATCH", "0") == "1"
 
 mcp = FastMCP("code-search")
 
-_embedder: Embedder | None = None
-_store: CodeSearchStore | None = None
+_embedder: "Embedder | None" = None
+_store: "CodeSearchStore | None" = None
+_index: "EmbeddingIndex | None" = None
+_watcher: IndexWatcher | None = None
+_jobs: JobQueue | None = None
+_ann_task: asyncio.Task | None = None
 
 
-def _get_embedder() -> Embedder:
+def _get_embedder() -> "Embedder":
     global _embedder
     if _embedder is None:
-        _embedder = Embedder()
+        from code_search.backends import create_backend
+        from code_search.cache import DEFAULT_MAX_ENTRIES, EmbeddingCache
+        from code_search.embedder import DEFAULT_QUERY_CACHE_SIZE, Embedder
+
+        cache = None
+        max_entries = EMBED_CACHE_MAX_ENTRIES
+        if max_entries is None:
+            max_entries = DEFAULT_MAX_ENTRIES
+        if max_entries:
+            cache = EmbeddingCache(max_entries=max_entries)
+        backend = create_backend(
+            EMBED_BACKEND, EMBED_MODEL, threads=EMBED_THREADS, parallel=EMBED_PARALLEL
+        )
+        if EMBED_DAEMON:
+            from code_search.daemon import DaemonBackend
+
+            backend = DaemonBackend(EMBED_MODEL, fallback=backend)
+        _embedder = Embedder(
+            cache=cache,
+            query_cache_size=(
+                DEFAULT_QUERY_CACHE_SIZE if QUERY_CACHE_SIZE is None else QUERY_CACHE_SIZE
+            ),
+            model_name=EMBED_MODEL,
+            dimensions=EMBED_DIMENSIONS,
+            backend=backend,
+        )
     return _embedder
 
 
-def _get_store() -> CodeSearchStore:
+def _get_store() -> "CodeSearchStore":
     global _store
     if _store is None:
+        from code_search.store import CodeSearchStore
+
         _store = CodeSearchStore()
     return _store
 
 
-def _resolve_files(paths: list[str]) -> list[str]:
-    """Resolve paths/directories into a flat list of indexable files."""
-    files = []
+def _get_index() -> "EmbeddingIndex":
+    """Build the resident embedding matrix on first use, then keep it in sync."""
+    global _index
+    if _index is None:
+        from code_search.index import EmbeddingIndex
+
+        store = _get_store()
+        embedder = _get_embedder()
+        _check_embedding_model(store, embedder)
+        _index = EmbeddingIndex.from_store(
+            store, embedder.dimensions, quantization=QUANTIZATION, train=False
+        )
+        if _index.needs_training():
+            _start_ann_training()
+    return _index
+
+
+def _sync_index(index: "EmbeddingIndex") -> None:
+    """Pick up chunks other server processes wrote to the shared database."""
+    if index.sync(_get_store()) and index.needs_training():
+        _start_ann_training()
+
+
+def _start_ann_training() -> None:
+    """Train the IVF partition in the background; searches are exact meanwhile."""
+    global _ann_task
+    if _ann_task is None or _ann_task.done():
+        _ann_task = asyncio.get_running_loop().create_task(_refresh_ann())
+
+
+def _train_ann(project_root: str) -> tuple:
+    """Worker thread: k-means over a snapshot of the store's embeddings.
+
+    Uses a connection of its own, as the server's store belongs to the
+    event loop thread.
+    """
+    from code_search.index import train_ann
+    from code_search.store import CodeSearchStore
+
+    store = CodeSearchStore(project_root)
+    try:
+        ids, embeddings = store.get_all_embeddings()
+    finally:
+        store.close()
+    return train_ann(ids, embeddings)
+
+
+def _compact_vectors(project_root: str) -> None:
+    """Worker thread: compact the sidecar through a connection of its own.
+
+    The server's store sees the new sidecar on its next read, the same way
+    it picks up a compaction by another process.
+    """
+    from code_search.store import CodeSearchStore
+
+    store = CodeSearchStore(project_root)
+    try:
+        store.compact_vectors()
+    finally:
+        store.close()
+
+
+async def _refresh_ann() -> None:
+    """Bring the IVF partition up to date without blocking queries.
+
+    Training runs in a worker thread; the index keeps answering queries with
+    its previous partition (or exactly) until the new one is swapped in.
+    """
+    index = _get_index()
+    if not index.needs_training():
+        index.refresh_ann()  # Drops or persists the partition; doesn't train
+        return
+    trained = await asyncio.to_thread(_train_ann, _get_store().project_root)
+    index.install_ann(*trained)
+
+
+def _check_embedding_model(store: "CodeSearchStore", embedder: "Embedder") -> None:
+    """Re-embed the project if it was indexed with another model or size."""
+    current = (embedder.model_name, embedder.dimensions)
+    recorded = store.get_embedding_model()
+    if recorded is None and store.get_stats()["total_chunks"]:
+        recorded = (DEFAULT_MODEL, DEFAULT_DIMENSIONS)  # Indexed before models were recorded
+    if recorded is None or recorded == current:
+        store.set_embedding_model(*current)
+        return
+    stale_files = store.reset_embeddings(*current)
+    if stale_files:
+        _get_jobs().submit(stale_files)
+
+
+def _get_watcher() -> IndexWatcher:
+    global _watcher
+    if _watcher is None:
+        _watcher = IndexWatcher(_reindex_changed, _is_watched_file)
+    return _watcher
+
+
+def _get_jobs() -> JobQueue:
+    global _jobs
+    if _jobs is None:
+        _jobs = JobQueue(_run_index_job, concurrency=INDEX_CONCURRENCY)
+    return _jobs
+
+
+def _get_indexer() -> "Indexer":
+    from code_search.embedder import DEFAULT_BATCH_SIZE
+    from code_search.indexer import DEFAULT_CHUNK_WORKERS, Indexer
+
+    return Indexer(
+        _get_store(),
+        _get_index(),
+        _get_embedder(),
+        batch_size=EMBED_BATCH_SIZE or DEFAULT_BATCH_SIZE,
+        chunk_workers=DEFAULT_CHUNK_WORKERS if CHUNK_WORKERS is None else CHUNK_WORKERS,
+    )
+
+
+def _is_watched_file(file_path: str) -> bool:
+    if not is_indexable(file_path):
+        return False
+    for root in _get_watcher().roots:
+        if Path(file_path).is_relative_to(root):
+            return not is_excluded(file_path, root)
+    return False
+
+
+async def _reindex_changed(changed: list[str], deleted: list[str]) -> None:
+    """Watcher callback: re-index touched files and drop deleted ones."""
+    indexer = _get_indexer()
+    result = await indexer.index_files(changed)
+    removed = indexer.remove_files(deleted)
+    if result.files_indexed or removed:
+        await _refresh_ann()
+
+
+def _resolve_files(paths: list[str], tracked_only: bool = False) -> Iterator[str]:
+    """Stream indexable files from paths/directories.
+
+    Directories are walked with ignore rules applied, or listed with
+    `git ls-files` when `tracked_only` is set and they are inside a repo.
+    """
     for p in paths:
         path = Path(p).expanduser().resolve()
         if path.is_file():
             if is_indexable(str(path)):
-                files.append(str(path))
+                yield str(path)
         elif path.is_dir():
-            for child in sorted(path.rglob("*")):
-                if child.is_file() and is_indexable(str(child)):
-                    # Skip hidden dirs and common non-code dirs
-                    parts = child.relative_to(path).parts
-                    if any(
-                        part.startswith(".")
-                        or part in ("node_modules", "__pycache__", ".venv", "venv", "dist", "build")
-                        for part in parts
-                    ):
-                        continue
-                    files.append(str(child))
-    return files
+            files = tracked_files(str(path)) if tracked_only else None
+            yield from files if files is not None else walk_files(str(path))
+
+
+def _format_progress(progress: "IndexProgress") -> str:
+    if progress.phase == "scanning":
+        return f"Checking files for changes: {progress.files_done} scanned"
+    message = (
+        f"Indexed {progress.files_done}/{progress.files_total} changed files, "
+        f"{progress.chunks_done} chunks ({progress.chunks_per_second:.1f} chunks/s)"
+    )
+    if progress.eta is not None:
+        minutes, seconds = divmod(int(progress.eta), 60)
+        message += f", ETA {minutes}m{seconds:02d}s"
+    return message
+
+
+async def _run_index_job(job: IndexJob, progress: "ProgressCallback") -> str:
+    """Index a job's paths; runs in a JobQueue worker."""
+    store = _get_store()
+
+    files = _resolve_files(job.paths, job.tracked_only)
+    first = next(files, None)
+    if first is None:
+        return "No indexable files found in the provided paths."
+
+    indexer = _get_indexer()
+    try:
+        result = await indexer.index_files(
+            chain([first], files), job.generate_descriptions, progress=progress
+        )
+    finally:
+        # Also after an interruption, so committed batches are fully indexed
+        if indexer.files_written:
+            await _refresh_ann()
+            await asyncio.to_thread(_compact_vectors, store.project_root)
+
+    if WATCH:
+        _get_watcher().watch(
+            [str(Path(p).expanduser().resolve()) for p in job.paths if Path(p).expanduser().is_dir()]
+        )
+
+    stats = store.get_stats()
+    return (
+        f"Indexed {result.chunks} chunks from {result.files_indexed} files "
+        f"({result.files_skipped} skipped, unchanged; "
+        f"{result.chunks_reused} chunk embeddings reused, "
+        f"{result.chunks_unchanged} unchanged chunks kept). "
+        f"Total index: {stats['total_chunks']} chunks across {stats['total_files']} files."
+    )
+
+
+def _format_job(job: IndexJob) -> str:
+    paths = ", ".join(job.paths[:3])
+    if len(job.paths) > 3:
+        paths += f" and {len(job.paths) - 3} more"
+    line = f"Job {job.id} [{job.status}] {paths}"
+    if job.status == RUNNING and job.progress is not None:
+        return f"{line}\n  {_format_progress(job.progress)}"
+    if job.summary:
+        return f"{line}\n  {job.summary}"
+    return line
+
+
+def _format_hits(store: "CodeSearchStore", hits: list[tuple[int, float]]) -> str:
+    """Render (chunk id, score) search hits with their stored source."""
+    from code_search.search import format_results
+
+    scores = dict(hits)
+    chunks = store.get_chunks_by_ids([chunk_id for chunk_id, _ in hits])
+    return format_results([(chunk, scores[chunk.id]) for chunk in chunks])
 
 
 @mcp.tool()
-async def load_code(paths: list[str], generate_descriptions: bool = False) -> str:
+async def load_code(
+    paths: list[str],
+    generate_descriptions: bool = False,
+    tracked_only: bool = False,
+    wait: bool = False,
+    ctx: Context | None = None,
+) -> str:
     """Index code files for semantic search.
 
     Resolves files from paths/directories, chunks them using tree-sitter
-    (Python, JS, TS, Bash) or line-based fallback, embeds with
-    nomic-embed-text-v1.5, and stores in SQLite.
+    (Python, JS, TS, Bash, Go, Rust, Java, C/C++, Ruby, SQL) or line-based
+    fallback, embeds with nomic-embed-text-v1.5, and stores in SQLite.
+
+    Indexing runs as a background job: this returns a job id immediately,
+    to poll with index_status (or stop with cancel_index). Searches keep
+    working meanwhile, and files are searchable as soon as they are
+    committed. An interrupted job resumes where it stopped when run again.
 
     Args:
         paths: List of file or directory paths to index
         generate_descriptions: If True, generate Haiku descriptions for each chunk (requires API key)
+        tracked_only: If True, index only files tracked by git (directories outside a
+            repo are walked as usual). Otherwise .gitignore/.ignore rules are honoured.
+        wait: If True, block until the job finishes, sending progress
+            notifications, and return its summary
     """
-    store = _get_store()
-    embedder = _get_embedder()
+    job = _get_jobs().submit(paths, generate_descriptions, tracked_only)
+    if not wait:
+        return (
+            f"Started indexing job {job.id}. "
+            "Use index_status to follow progress; prior_art_search works meanwhile."
+        )
+
+    async def report(progress: "IndexProgress") -> None:
+        if ctx is not None:
+            await ctx.report_progress(
+                progress.files_done, progress.files_total, _format_progress(progress)
+            )
 
-    files = _resolve_files(paths)
-    if not files:
-        return "No indexable files found in the provided paths."
+    job.on_progress = report
+    try:
+        await job.wait()
+    except asyncio.CancelledError:
+        _get_jobs().cancel(job.id)
+        raise
+    return job.summary
 
-    total_chunks = 0
-    files_indexed = 0
-    files_skipped = 0
-
-    for file_path in files:
-        try:
-            current_mtime = os.path.getmtime(file_path)
-        except OSError:
-            continue
-
-        stored_mtime = store.get_file_mtime(file_path)
-        if stored_mtime is not None and stored_mtime >= current_mtime:
-            files_skipped += 1
-            continue
-
-        # Re-index: delete old chunks, create new ones
-        store.delete_file_chunks(file_path)
-
-        chunks = chunk_file(file_path)
-        if not chunks:
-            continue
-
-        # Batch embed all chunks for this file
-        texts = [c.source_code for c in chunks]
-        embeddings = embedder.embed_documents(texts)
-
-        # Optionally generate descriptions
-        descriptions: list[str | None] = [None] * len(chunks)
-        if generate_descriptions:
-            try:
-                from code_search.describer import describe_chunks
-                descriptions = await describe_chunks(chunks, file_path)
-            except Exception:
-                pass  # Graceful failure, chunks still indexed without descriptions
-
-        for chunk, embedding, description in zip(chunks, embeddings, descriptions):
-            store.insert_chunk(
-                file_path=file_path,
-                file_mtime=current_mtime,
-                chunk_type=chunk.chunk_type,
-                chunk_name=chunk.chunk_name,
-                start_line=chunk.start_line,
-                end_line=chunk.end_line,
-                source_code=chunk.source_code,
-                embedding=embedding,
-                description=description,
-            )
 
-        total_chunks += len(chunks)
-        files_indexed += 1
+@mcp.tool()
+async def index_status(job_id: int | None = None) -> str:
+    """Show indexing jobs started by load_code.
 
-    stats = store.get_stats()
-    return (
-        f"Indexed {total_chunks} chunks from {files_indexed} files "
-        f"({files_skipped} skipped, unchanged). "
-        f"Total index: {stats['total_chunks']} chunks across {stats['total_files']} files."
-    )
+    Args:
+        job_id: A single job to show; by default all recent jobs are listed
+    """
+    jobs = _get_jobs()
+    if job_id is not None:
+        job = jobs.get(job_id)
+        return _format_job(job) if job else f"No job {job_id}."
+    if not jobs.jobs():
+        return "No indexing jobs."
+    return "\n".join(_format_job(job) for job in reversed(jobs.jobs()))
 
 
 @mcp.tool()
-async def prior_art_search(query: str, limit: int = 10) -> str:
-    """Search indexed code by semantic similarity.
+async def cancel_index(job_id: int) -> str:
+    """Cancel a queued or running indexing job.
+
+    Files already committed stay indexed; run load_code again to resume.
+
+    Args:
+        job_id: Job id returned by load_code
+    """
+    job = _get_jobs().get(job_id)
+    if job is None:
+        return f"No job {job_id}."
+    if job.status not in (QUEUED, RUNNING):
+        return f"Job {job_id} already {job.status}."
+    _get_jobs().cancel(job_id)
+    return f"Cancelling job {job_id}."
+
+
+@mcp.tool()
+async def prior_art_search(
+    query: str, limit: int = 10, nprobe: int | None = None, mode: str = "hybrid"
+) -> str:
+    """Search indexed code by semantic similarity and keywords.
 
     Finds code chunks that are semantically similar to the query,
     useful for finding prior art, patterns, and relevant implementations.
+    By default the semantic ranking is fused with a BM25 keyword ranking,
+    so exact identifiers rank first. A query that is a single identifier
+    (e.g. `get_file_mtime`) is answered from keywords alone when it matches.
 
     Args:
         query: Natural language description of what you're looking for
         limit: Maximum number of results to return (default 10)
+        nprobe: On large indexes, number of clusters to scan; higher is slower but
+            more accurate. 0 forces exact search. Small indexes are always exact.
+        mode: "hybrid" (default), "semantic" (embeddings only) or "keyword" (BM25 only)
     """
+    if mode not in SEARCH_MODES:
+        return f"Unknown mode {mode!r}; use one of {', '.join(SEARCH_MODES)}."
+    if nprobe is not None and nprobe < 0:
+        return f"Invalid nprobe {nprobe}; use 0 for exact search or a positive cluster count."
+
+    from code_search.search import is_identifier_query, reciprocal_rank_fusion
+
     store = _get_store()
-    embedder = _get_embedder()
+    index = _get_index()
+    _sync_index(index)
 
-    chunks = store.get_all_chunks()
-    if not chunks:
+    if not len(index):
+        if any(job.status in (QUEUED, RUNNING) for job in _get_jobs().jobs()):
+            return "No code indexed yet; indexing is in progress (see index_status)."
         return "No code indexed yet. Use load_code first to index some files."
 
-    query_embedding = embedder.embed_query(query)
-    results = cosine_similarity_search(query_embedding, chunks, limit=limit)
+    # An identifier is answered by its exact matches alone, without the model
+    if mode == "hybrid" and is_identifier_query(query):
+        hits = store.search_lexical(query, limit, phrase=True)
+        if hits:
+            return _format_hits(store, hits)
 
-    return format_results(results)
+    candidates = limit * HYBRID_CANDIDATE_FACTOR if mode == "hybrid" else limit
+    lexical = store.search_lexical(query, candidates) if mode != "semantic" else []
+
+    if mode == "keyword":
+        hits = lexical[:limit]
+    else:
+        query_embedding = _get_embedder().embed_query(query)
+        semantic = index.search(query_embedding, limit=candidates, nprobe=nprobe)
+        if lexical:
+            hits = reciprocal_rank_fusion(
+                [[chunk_id for chunk_id, _ in semantic], [chunk_id for chunk_id, _ in lexical]]
+            )[:limit]
+        else:
+            hits = semantic[:limit]
+
+    return _format_hits(store, hits)
+
+
+@mcp.tool()
+async def index_stats() -> str:
+    """Show index size and embedding model timings (load time vs. inference)."""
+    stats = _get_store().get_stats()
+    index = _get_index()
+    _sync_index(index)
+    embedder = _get_embedder().get_stats()
+
+    load = embedder["model_load_seconds"]
+    lines = [
+        f"Chunks: {stats['total_chunks']} across {stats['total_files']} files",
+        f"Database: {stats['db_path']}",
+        f"Resident vectors: {len(index)} ({index.nbytes / 2**20:.1f} MiB)",
+        f"Model: {embedder['model']} ({embedder['dimensions']} dims), "
+        + (f"loaded in {load:.2f}s" if load is not None else "not loaded"),
+        f"Queries: {embedder['queries']} ({embedder['query_cache_hits']} cache hits), "
+        f"{embedder['query_inference_seconds']:.2f}s inference",
+        f"Documents embedded: {embedder['documents_embedded']}, "
+        f"{embedder['document_inference_seconds']:.2f}s inference",
+    ]
+    return "\n".join(lines)
 
 
 def main():
+    if WARM_UP:
+        _get_embedder().start_warm_up()
     mcp.run(transport="stdio")
 
 
@@ -1,13 +1,21 @@
-"""SQLite storage for code chunks and embeddings."""
+"""SQLite storage for code chunks, with embeddings in a memory-mapped sidecar."""
 
 import hashlib
 import os
+import re
 import sqlite3
+from collections.abc import Callable
+from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
+from typing import TypeVar
 
 import numpy as np
 
+from code_search.chunker import ChunkDiff, CodeChunk
+from code_search.hashing import text_hash
+from code_search.vectors import VectorFile
+
 SCHEMA_SQL = """
 CREATE TABLE IF NOT EXISTS chunks (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -19,13 +27,60 @@ CREATE TABLE IF NOT EXISTS chunks (
     end_line INTEGER NOT NULL,
     source_code TEXT NOT NULL,
     description TEXT,
-    embedding BLOB NOT NULL,
+    vec_row INTEGER NOT NULL,
+    chunk_hash TEXT,
     created_at REAL DEFAULT (unixepoch('now'))
 );
 CREATE INDEX IF NOT EXISTS idx_chunks_file ON chunks(file_path);
 CREATE INDEX IF NOT EXISTS idx_chunks_mtime ON chunks(file_path, file_mtime);
+CREATE TABLE IF NOT EXISTS files (
+    file_path TEXT PRIMARY KEY,
+    file_mtime REAL NOT NULL,
+    file_hash TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
 """
 
+# Full-text index over the searchable chunk columns, kept in sync by triggers.
+# The default tokenizer splits on "_", so an identifier query such as
+# "get_file_mtime" becomes a phrase matching exactly that token sequence.
+FTS_SCHEMA_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+    chunk_name, source_code, description, content='chunks', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS chunks_fts_insert AFTER INSERT ON chunks BEGIN
+    INSERT INTO chunks_fts (rowid, chunk_name, source_code, description)
+    VALUES (new.id, new.chunk_name, new.source_code, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS chunks_fts_delete AFTER DELETE ON chunks BEGIN
+    INSERT INTO chunks_fts (chunks_fts, rowid, chunk_name, source_code, description)
+    VALUES ('delete', old.id, old.chunk_name, old.source_code, old.description);
+END;
+CREATE TRIGGER IF NOT EXISTS chunks_fts_update
+AFTER UPDATE OF chunk_name, source_code, description ON chunks BEGIN
+    INSERT INTO chunks_fts (chunks_fts, rowid, chunk_name, source_code, description)
+    VALUES ('delete', old.id, old.chunk_name, old.source_code, old.description);
+    INSERT INTO chunks_fts (rowid, chunk_name, source_code, description)
+    VALUES (new.id, new.chunk_name, new.source_code, new.description);
+END;
+"""
+
+# BM25 column weights: a hit in the chunk name counts most
+FTS_WEIGHTS = (10.0, 1.0, 2.0)
+
+# Compact the vector sidecar once dead rows outnumber live ones by this much
+COMPACT_MIN_DEAD_ROWS = 10_000
+SQL_VARIABLE_BATCH = 10_000  # Ids bound per `IN (...)` query
+
+
+T = TypeVar("T")
+
+CHUNK_COLUMNS = """id, file_path, file_mtime, chunk_type, chunk_name,
+    start_line, end_line, source_code, description"""
+
 
 @dataclass(frozen=True)
 class StoredChunk:
@@ -38,7 +93,21 @@ class StoredChunk:
     end_line: int
     source_code: str
     description: str | None
-    embedding: np.ndarray
+
+
+def _row_to_chunk(row: tuple) -> StoredChunk:
+    """Build a StoredChunk from a row of CHUNK_COLUMNS."""
+    return StoredChunk(
+        id=row[0],
+        file_path=row[1],
+        file_mtime=row[2],
+        chunk_type=row[3],
+        chunk_name=row[4],
+        start_line=row[5],
+        end_line=row[6],
+        source_code=row[7],
+        description=row[8],
+    )
 
 
 def _db_path_for_project(project_root: str) -> Path:
@@ -50,6 +119,13 @@ def _db_path_for_project(project_root: str) -> Path:
 
 
 class CodeSearchStore:
+    """Chunk metadata in SQLite; embeddings in an append-only float32 sidecar.
+
+    Each chunk row holds `vec_row`, its row in the sidecar file named by the
+    `vector_file` meta key. Appends to the sidecar happen inside the SQLite
+    write transaction, so concurrent server processes never misnumber rows.
+    """
+
     def __init__(self, project_root: str | None = None):
         if project_root is None:
             project_root = os.getcwd()
@@ -60,21 +136,239 @@ class CodeSearchStore:
         self._conn.execute("PRAGMA synchronous=NORMAL")
         self._conn.executescript(SCHEMA_SQL)
         self._conn.commit()
+        self._vectors: VectorFile | None = None
+        self._transaction_depth = 0
+        self._migrate_embedding_blobs()
+        self._migrate_content_hashes()
+        self._migrate_fts()
+
+    @property
+    def db_path(self) -> Path:
+        return self._db_path
+
+    @property
+    def project_root(self) -> str:
+        return self._project_root
+
+    @contextmanager
+    def _transaction(self):
+        """Run a block inside one IMMEDIATE (write-locked) transaction.
+
+        Nested uses join the outermost transaction, which commits once.
+        """
+        if self._transaction_depth:
+            self._transaction_depth += 1
+            try:
+                yield
+            finally:
+                self._transaction_depth -= 1
+            return
+
+        self._conn.execute("BEGIN IMMEDIATE")
+        self._transaction_depth = 1
+        try:
+            yield
+        except BaseException:
+            self._conn.rollback()
+            raise
+        else:
+            self._conn.commit()
+        finally:
+            self._transaction_depth = 0
+
+    @contextmanager
+    def _snapshot(self):
+        """Run a group of reads against one consistent snapshot of the database.
+
+        Outside a transaction every statement sees the latest commit, so the
+        sidecar named in `meta` and the `vec_row`s read next could straddle a
+        compaction. Inside a write transaction the reads already agree.
+        """
+        if self._conn.in_transaction:
+            yield
+            return
+        self._conn.execute("BEGIN")
+        try:
+            yield
+        finally:
+            self._conn.commit()
+
+    def _read_vectors(self, read: Callable[[VectorFile], T], default: T) -> T:
+        """Call `read` with the current sidecar inside one read snapshot.
+
+        Returns `default` when there is no sidecar yet. A compaction may unlink
+        the snapshot's sidecar before it is mapped; the read is then retried
+        once on a fresh snapshot, which names the new file.
+        """
+
+        def attempt() -> T:
+            with self._snapshot():
+                vectors = self._get_vectors()
+                return default if vectors is None else read(vectors)
+
+        try:
+            return attempt()
+        except FileNotFoundError:
+            if self._conn.in_transaction:
+                raise  # Compactions wait for our write lock, so the file is really gone
+            return attempt()
+
+    @contextmanager
+    def batch(self):
+        """Group writes (e.g. many replace_file_chunks calls) into one commit."""
+        with self._transaction():
+            yield self
+
+    def _get_meta(self, key: str) -> str | None:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)
+        )
+
+    def _get_vectors(self, dimensions: int | None = None) -> VectorFile | None:
+        """Open the current sidecar file, creating it if `dimensions` is given.
+
+        Re-reads the meta table each call so a compaction by another process
+        is picked up.
+        """
+        name = self._get_meta("vector_file")
+        if name is None:
+            if dimensions is None:
+                return None
+            name = f"{self._db_path.stem}.vec"
+            self._set_meta("vector_file", name)
+            self._set_meta("vector_dimensions", str(dimensions))
+
+        if self._vectors is None or self._vectors.path.name != name:
+            stored_dimensions = int(self._get_meta("vector_dimensions"))
+            self._vectors = VectorFile(self._db_path.with_name(name), stored_dimensions)
+        return self._vectors
+
+    def _migrate_embedding_blobs(self) -> None:
+        """Move embeddings out of a pre-sidecar `chunks.embedding` BLOB column."""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")}
+        if "embedding" not in columns:
+            return
+
+        with self._transaction():
+            self._conn.execute("ALTER TABLE chunks ADD COLUMN vec_row INTEGER")
+            rows = self._conn.execute(
+                "SELECT id, embedding FROM chunks ORDER BY id"
+            ).fetchall()
+            if rows:
+                matrix = np.frombuffer(
+                    b"".join(row[1] for row in rows), dtype=np.float32
+                ).reshape(len(rows), -1)
+                vectors = self._get_vectors(matrix.shape[1])
+                first = vectors.append(matrix)
+                self._conn.executemany(
+                    "UPDATE chunks SET vec_row = ? WHERE id = ?",
+                    [(first + i, row[0]) for i, row in enumerate(rows)],
+                )
+            self._conn.execute("ALTER TABLE chunks DROP COLUMN embedding")
+        self._conn.execute("VACUUM")
+
+    def _migrate_content_hashes(self) -> None:
+        """Add hash columns and the files table to a pre-hash database."""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")}
+        if "chunk_hash" not in columns:
+            with self._transaction():
+                self._conn.execute("ALTER TABLE chunks ADD COLUMN chunk_hash TEXT")
+                # Files keep their mtimes, so unchanged ones are still skipped. A file
+                # whose mtime moves has no stored hash to compare against, so it is
+                # re-chunked; its chunks are then matched by the hashes filled in below,
+                # and only the ones that really changed are re-embedded.
+                self._conn.execute(
+                    """INSERT OR IGNORE INTO files (file_path, file_mtime)
+                       SELECT file_path, MAX(file_mtime) FROM chunks GROUP BY file_path"""
+                )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_chunks_hash ON chunks(chunk_hash)"
+        )
+        self._conn.commit()
+        # Also repairs databases migrated before hashes were filled in here
+        unhashed = self._conn.execute(
+            "SELECT id, source_code FROM chunks WHERE chunk_hash IS NULL"
+        ).fetchall()
+        if unhashed:
+            with self._transaction():
+                self._conn.executemany(
+                    "UPDATE chunks SET chunk_hash = ? WHERE id = ?",
+                    [(text_hash(source_code), chunk_id) for chunk_id, source_code in unhashed],
+                )
+
+    def _migrate_fts(self) -> None:
+        """Create the full-text index, filling it from existing chunks once."""
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'chunks_fts'"
+        ).fetchone()
+        self._conn.executescript(FTS_SCHEMA_SQL)
+        if not exists:
+            with self._transaction():
+                self._conn.execute("INSERT INTO chunks_fts (chunks_fts) VALUES ('rebuild')")
+        self._conn.commit()
+
+    def _upsert_file(self, file_path: str, file_mtime: float, file_hash: str | None) -> None:
+        self._conn.execute(
+            """INSERT INTO files (file_path, file_mtime, file_hash) VALUES (?, ?, ?)
+               ON CONFLICT(file_path) DO UPDATE SET
+                   file_mtime = excluded.file_mtime,
+                   file_hash = COALESCE(excluded.file_hash, files.file_hash)""",
+            (file_path, file_mtime, file_hash),
+        )
 
     def get_file_mtime(self, file_path: str) -> float | None:
         """Get stored mtime for a file. Returns None if not indexed."""
+        record = self.get_file_record(file_path)
+        return record[0] if record else None
+
+    def get_file_record(self, file_path: str) -> tuple[float, str | None] | None:
+        """Get (mtime, content hash) for a file. Returns None if not indexed."""
         row = self._conn.execute(
-            "SELECT file_mtime FROM chunks WHERE file_path = ? LIMIT 1",
+            "SELECT file_mtime, file_hash FROM files WHERE file_path = ?",
             (file_path,),
         ).fetchone()
-        return row[0] if row else None
+        return (row[0], row[1]) if row else None
+
+    def touch_file(self, file_path: str, file_mtime: float) -> None:
+        """Record a new mtime for a file whose content hash is unchanged."""
+        with self._transaction():
+            self._conn.execute(
+                "UPDATE files SET file_mtime = ? WHERE file_path = ?",
+                (file_mtime, file_path),
+            )
+            self._conn.execute(
+                "UPDATE chunks SET file_mtime = ? WHERE file_path = ?",
+                (file_mtime, file_path),
+            )
+
+    def get_file_chunk_keys(self, file_path: str) -> list[tuple[int, str, str, str | None]]:
+        """Get (id, chunk_type, chunk_name, chunk_hash) for a file's chunks, for diff_chunks."""
+        return self._conn.execute(
+            "SELECT id, chunk_type, chunk_name, chunk_hash FROM chunks WHERE file_path = ?",
+            (file_path,),
+        ).fetchall()
+
+    def get_file_chunk_ids(self, file_path: str) -> list[int]:
+        """Get ids of all chunks stored for a file."""
+        rows = self._conn.execute(
+            "SELECT id FROM chunks WHERE file_path = ?", (file_path,)
+        ).fetchall()
+        return [row[0] for row in rows]
 
     def delete_file_chunks(self, file_path: str) -> int:
-        """Delete all chunks for a file. Returns count deleted."""
-        cursor = self._conn.execute(
-            "DELETE FROM chunks WHERE file_path = ?", (file_path,)
-        )
-        self._conn.commit()
+        """Delete all chunks for a file. Returns count deleted.
+
+        Their sidecar rows become dead until compact_vectors() runs.
+        """
+        with self._transaction():
+            cursor = self._conn.execute(
+                "DELETE FROM chunks WHERE file_path = ?", (file_path,)
+            )
+            self._conn.execute("DELETE FROM files WHERE file_path = ?", (file_path,))
         return cursor.rowcount
 
     def insert_chunk(
@@ -90,56 +384,384 @@ class CodeSearchStore:
         description: str | None = None,
     ) -> int:
         """Insert a chunk and return its id."""
-        cursor = self._conn.execute(
-            """INSERT INTO chunks
-               (file_path, file_mtime, chunk_type, chunk_name,
-                start_line, end_line, source_code, description, embedding)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-            (
-                file_path,
-                file_mtime,
-                chunk_type,
-                chunk_name,
-                start_line,
-                end_line,
-                source_code,
-                description,
-                embedding.astype(np.float32).tobytes(),
-            ),
-        )
-        self._conn.commit()
+        with self._transaction():
+            vectors = self._get_vectors(len(embedding))
+            vec_row = vectors.append(embedding.reshape(1, -1))
+            cursor = self._conn.execute(
+                """INSERT INTO chunks
+                   (file_path, file_mtime, chunk_type, chunk_name,
+                    start_line, end_line, source_code, description, vec_row,
+                    chunk_hash)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    file_path,
+                    file_mtime,
+                    chunk_type,
+                    chunk_name,
+                    start_line,
+                    end_line,
+                    source_code,
+                    description,
+                    vec_row,
+                    text_hash(source_code),
+                ),
+            )
+            self._upsert_file(file_path, file_mtime, None)
         return cursor.lastrowid
 
-    def get_all_chunks(self) -> list[StoredChunk]:
-        """Load all chunks with their embeddings."""
+    def replace_file_chunks(
+        self,
+        file_path: str,
+        file_mtime: float,
+        chunks: list[CodeChunk],
+        embeddings: list[np.ndarray] | np.ndarray,
+        descriptions: list[str | None] | None = None,
+        file_hash: str | None = None,
+    ) -> list[int]:
+        """Atomically swap a file's chunks for new ones. Returns the new ids.
+
+        Deletes the old rows and bulk-inserts the new ones with a single
+        sidecar append and `executemany`, all in one transaction. The file's
+        mtime and content hash are recorded even when it has no chunks.
+        """
+        if descriptions is None:
+            descriptions = [None] * len(chunks)
+        with self._transaction():
+            self._conn.execute("DELETE FROM chunks WHERE file_path = ?", (file_path,))
+            self._upsert_file(file_path, file_mtime, file_hash)
+            if not chunks:
+                return []
+            matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(chunks), -1)
+            first = self._get_vectors(matrix.shape[1]).append(matrix)
+            self._conn.executemany(
+                """INSERT INTO chunks
+                   (file_path, file_mtime, chunk_type, chunk_name,
+                    start_line, end_line, source_code, description, vec_row,
+                    chunk_hash)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                [
+                    (
+                        file_path,
+                        file_mtime,
+                        chunk.chunk_type,
+                        chunk.chunk_name,
+                        chunk.start_line,
+                        chunk.end_line,
+                        chunk.source_code,
+                        description,
+                        first + i,
+                        text_hash(chunk.source_code),
+                    )
+                    for i, (chunk, description) in enumerate(zip(chunks, descriptions))
+                ],
+            )
+            rows = self._conn.execute(
+                "SELECT id FROM chunks WHERE file_path = ? ORDER BY id", (file_path,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def update_file_chunks(
+        self,
+        file_path: str,
+        file_mtime: float,
+        chunks: list[CodeChunk],
+        diff: ChunkDiff,
+        embeddings: list[np.ndarray | None],
+        descriptions: list[str | None] | None = None,
+        file_hash: str | None = None,
+    ) -> list[int]:
+        """Apply a ChunkDiff to a file's stored chunks. Returns ids aligned with `chunks`.
+
+        Only the rows that differ are rewritten: kept chunks just get their
+        line range and mtime updated, changed chunks are updated in place
+        (keeping their ids), and only changed and added chunks append
+        vectors to the sidecar. `embeddings` and `descriptions` are read
+        for those chunks only.
+        """
+        if descriptions is None:
+            descriptions = [None] * len(chunks)
+        ids = [0] * len(chunks)
+        with self._transaction():
+            self._upsert_file(file_path, file_mtime, file_hash)
+            self._conn.executemany(
+                "DELETE FROM chunks WHERE id = ?", [(chunk_id,) for chunk_id in diff.removed]
+            )
+            self._conn.executemany(
+                "UPDATE chunks SET file_mtime = ?, start_line = ?, end_line = ? WHERE id = ?",
+                [
+                    (file_mtime, chunks[i].start_line, chunks[i].end_line, chunk_id)
+                    for chunk_id, i in diff.kept
+                ],
+            )
+            for chunk_id, i in diff.kept:
+                ids[i] = chunk_id
+
+            fresh = [i for _, i in diff.changed] + diff.added
+            if not fresh:
+                return ids
+            matrix = np.asarray([embeddings[i] for i in fresh], dtype=np.float32)
+            first = self._get_vectors(matrix.shape[1]).append(matrix)
+            vec_row_of = {i: first + n for n, i in enumerate(fresh)}
+            self._conn.executemany(
+                """UPDATE chunks SET
+                       file_mtime = ?, chunk_type = ?, chunk_name = ?,
+                       start_line = ?, end_line = ?, source_code = ?,
+                       description = ?, vec_row = ?, chunk_hash = ?
+                   WHERE id = ?""",
+                [
+                    (
+                        file_mtime,
+                        chunks[i].chunk_type,
+                        chunks[i].chunk_name,
+                        chunks[i].start_line,
+                        chunks[i].end_line,
+                        chunks[i].source_code,
+                        descriptions[i],
+                        vec_row_of[i],
+                        text_hash(chunks[i].source_code),
+                        chunk_id,
+                    )
+                    for chunk_id, i in diff.changed
+                ],
+            )
+            for chunk_id, i in diff.changed:
+                ids[i] = chunk_id
+            for i in diff.added:
+                chunk = chunks[i]
+                ids[i] = self._conn.execute(
+                    """INSERT INTO chunks
+                       (file_path, file_mtime, chunk_type, chunk_name,
+                        start_line, end_line, source_code, description, vec_row,
+                        chunk_hash)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (
+                        file_path,
+                        file_mtime,
+                        chunk.chunk_type,
+                        chunk.chunk_name,
+                        chunk.start_line,
+                        chunk.end_line,
+                        chunk.source_code,
+                        descriptions[i],
+                        vec_row_of[i],
+                        text_hash(chunk.source_code),
+                    ),
+                ).lastrowid
+        return ids
+
+    def data_version(self) -> int:
+        """A counter that changes whenever another connection commits a write.
+
+        Writes through this store's own connection leave it unchanged.
+        """
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def get_vector_rows(self) -> tuple[np.ndarray, np.ndarray]:
+        """(ids in ascending order, their sidecar rows), without loading any vectors.
+
+        A chunk re-embedded in place keeps its id but gets a new row.
+        """
+        rows = self._conn.execute("SELECT id, vec_row FROM chunks ORDER BY id").fetchall()
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        vec_rows = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+        return ids, vec_rows
+
+    def get_all_embeddings(self) -> tuple[np.ndarray, np.ndarray]:
+        """Load (ids, embedding matrix) without touching any chunk text.
+
+        Gathers rows straight from the memory-mapped sidecar.
+        """
+        empty = np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+
+        def read(vectors: VectorFile) -> tuple[np.ndarray, np.ndarray]:
+            rows = self._conn.execute(
+                "SELECT id, vec_row FROM chunks ORDER BY vec_row"
+            ).fetchall()
+            if not rows:
+                return empty
+            ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+            vec_rows = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+            return ids, vectors.view()[vec_rows]
+
+        return self._read_vectors(read, empty)
+
+    def get_embeddings_by_ids(
+        self, ids: list[int] | np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Load raw embeddings for `ids` from the memory-mapped sidecar.
+
+        Returns (mask over `ids` of the chunks still stored, their embeddings
+        in order). Another server process sharing the database may have
+        deleted some of the ids since this one loaded them.
+        """
+        ids = [int(i) for i in ids]
+        missing = np.zeros(len(ids), dtype=bool), np.empty((0, 0), dtype=np.float32)
+
+        def read(vectors: VectorFile) -> tuple[np.ndarray, np.ndarray]:
+            vec_row_of: dict[int, int] = {}
+            for start in range(0, len(ids), SQL_VARIABLE_BATCH):
+                batch = ids[start : start + SQL_VARIABLE_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                vec_row_of.update(
+                    self._conn.execute(
+                        f"SELECT id, vec_row FROM chunks WHERE id IN ({placeholders})",
+                        batch,
+                    ).fetchall()
+                )
+            if not vec_row_of:
+                return missing
+            found = np.fromiter((i in vec_row_of for i in ids), dtype=bool, count=len(ids))
+            return found, vectors.view()[[vec_row_of[i] for i in ids if i in vec_row_of]]
+
+        return self._read_vectors(read, missing) if ids else missing
+
+    def get_embeddings_by_chunk_hashes(self, hashes: list[str]) -> dict[str, np.ndarray]:
+        """Find stored embeddings for chunk source hashes, from any file."""
+        unique = list(set(hashes))
+
+        def read(vectors: VectorFile) -> dict[str, np.ndarray]:
+            vec_row_of: dict[str, int] = {}
+            for start in range(0, len(unique), SQL_VARIABLE_BATCH):
+                batch = unique[start : start + SQL_VARIABLE_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                vec_row_of.update(
+                    self._conn.execute(
+                        f"""SELECT chunk_hash, vec_row FROM chunks
+                            WHERE chunk_hash IN ({placeholders})""",
+                        batch,
+                    ).fetchall()
+                )
+            if not vec_row_of:
+                return {}
+            view = vectors.view()
+            return {h: np.array(view[row]) for h, row in vec_row_of.items()}
+
+        return self._read_vectors(read, {}) if unique else {}
+
+    def compact_vectors(self) -> bool:
+        """Rewrite the sidecar without dead rows once they dominate it.
+
+        Writes a new generation of the file and switches to it in the same
+        transaction that renumbers `vec_row`, so a crash leaves the old,
+        consistent pair in place. Returns True if the file was compacted.
+        """
+        vectors = self._get_vectors()
+        if vectors is None:
+            return False
+        live = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        dead = len(vectors) - live
+        if dead < COMPACT_MIN_DEAD_ROWS or dead < live:
+            return False
+
+        with self._transaction():
+            # Re-read under the write lock, in case another process compacted first
+            vectors = self._get_vectors()
+            rows = self._conn.execute(
+                "SELECT id, vec_row FROM chunks ORDER BY vec_row"
+            ).fetchall()
+            vec_rows = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+            generation = int(self._get_meta("vector_generation") or 0) + 1
+            name = f"{self._db_path.stem}.{generation}.vec"
+            compacted = VectorFile(self._db_path.with_name(name), vectors.dimensions)
+            compacted.rewrite(vectors.view()[vec_rows])
+            self._conn.executemany(
+                "UPDATE chunks SET vec_row = ? WHERE id = ?",
+                [(i, row[0]) for i, row in enumerate(rows)],
+            )
+            self._set_meta("vector_file", name)
+            self._set_meta("vector_generation", str(generation))
+
+        # Processes still mapping the old file keep their pages until they re-read meta
+        vectors.path.unlink(missing_ok=True)
+        self._vectors = compacted
+        return True
+
+    def get_embedding_model(self) -> tuple[str, int] | None:
+        """The (model, dimensions) stored embeddings were made with, if recorded."""
+        model = self._get_meta("embedding_model")
+        dimensions = self._get_meta("embedding_dimensions")
+        if model is None or dimensions is None:
+            return None
+        return model, int(dimensions)
+
+    def set_embedding_model(self, model_name: str, dimensions: int) -> None:
+        with self._transaction():
+            self._set_meta("embedding_model", model_name)
+            self._set_meta("embedding_dimensions", str(dimensions))
+
+    def reset_embeddings(self, model_name: str, dimensions: int) -> list[str]:
+        """Drop every chunk and start a new sidecar for a different model.
+
+        Vectors from different models (or truncations) are not comparable,
+        so nothing is kept. Returns the previously indexed file paths, for
+        the caller to re-index.
+        """
+        vectors = self._get_vectors()
+        with self._transaction():
+            file_paths = [
+                row[0] for row in self._conn.execute("SELECT file_path FROM files")
+            ]
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.execute("DELETE FROM files")
+            if vectors is not None:
+                generation = int(self._get_meta("vector_generation") or 0) + 1
+                self._set_meta("vector_file", f"{self._db_path.stem}.{generation}.vec")
+                self._set_meta("vector_generation", str(generation))
+                self._set_meta("vector_dimensions", str(dimensions))
+            self.set_embedding_model(model_name, dimensions)
+
+        if vectors is not None:
+            vectors.path.unlink(missing_ok=True)
+            self._vectors = None
+        return file_paths
+
+    def get_chunks_by_ids(self, ids: list[int]) -> list[StoredChunk]:
+        """Load chunk metadata and source (no embeddings) in the order of `ids`.
+
+        Unknown ids are skipped.
+        """
+        if not ids:
+            return []
+        placeholders = ",".join("?" * len(ids))
         rows = self._conn.execute(
-            """SELECT id, file_path, file_mtime, chunk_type, chunk_name,
-                      start_line, end_line, source_code, description, embedding
-               FROM chunks"""
+            f"SELECT {CHUNK_COLUMNS} FROM chunks WHERE id IN ({placeholders})",
+            list(ids),
         ).fetchall()
-        return [
-            StoredChunk(
-                id=row[0],
-                file_path=row[1],
-                file_mtime=row[2],
-                chunk_type=row[3],
-                chunk_name=row[4],
-                start_line=row[5],
-                end_line=row[6],
-                source_code=row[7],
-                description=row[8],
-                embedding=np.frombuffer(row[9], dtype=np.float32),
-            )
-            for row in rows
-        ]
+        by_id = {row[0]: _row_to_chunk(row) for row in rows}
+        return [by_id[i] for i in ids if i in by_id]
+
+    def search_lexical(
+        self, query: str, limit: int = 10, phrase: bool = False
+    ) -> list[tuple[int, float]]:
+        """BM25 keyword search over chunk names, source and descriptions.
+
+        Any word of the query may match; identifiers match as phrases. With
+        `phrase` the whole query must match as one phrase, so a dotted name
+        such as `os.path.join` does not match a chunk mentioning just `os`.
+        Returns (chunk_id, score) pairs, best first, higher scores better.
+        """
+        terms = re.findall(r"\w+", query)
+        if not terms or limit <= 0:
+            return []
+        if phrase:
+            match = '"' + " ".join(terms) + '"'
+        else:
+            match = " OR ".join(f'"{term}"' for term in dict.fromkeys(terms))
+        weights = ", ".join(str(w) for w in FTS_WEIGHTS)
+        rows = self._conn.execute(
+            f"""SELECT rowid, -bm25(chunks_fts, {weights}) AS score FROM chunks_fts
+                WHERE chunks_fts MATCH ? ORDER BY score DESC LIMIT ?""",
+            (match, limit),
+        ).fetchall()
+        return [(row[0], row[1]) for row in rows]
 
     def update_description(self, chunk_id: int, description: str) -> None:
         """Update the description for a chunk."""
-        self._conn.execute(
-            "UPDATE chunks SET description = ? WHERE id = ?",
-            (description, chunk_id),
-        )
-        self._conn.commit()
+        with self._transaction():
+            self._conn.execute(
+                "UPDATE chunks SET description = ? WHERE id = ?",
+                (description, chunk_id),
+            )
 
     def get_stats(self) -> dict:
         """Get index statistics."""
@@ -150,6 +772,7 @@ class CodeSearchStore:
             "total_chunks": row[0],
             "total_files": row[1],
             "db_path": str(self._db_path),
+            "vector_file": str(vectors.path) if (vectors := self._get_vectors()) else None,
         }
 
     def close(self) -> None:
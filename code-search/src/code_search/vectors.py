@@ -0,0 +1,78 @@
+"""Append-only float32 sidecar file for embeddings, read through np.memmap."""
+
+import fcntl
+import os
+from pathlib import Path
+
+import numpy as np
+
+
+class VectorFile:
+    """Fixed-width rows of raw float32 vectors addressed by row number.
+
+    Rows are only ever appended; deleted chunks leave dead rows behind until
+    the owning store compacts the file. Reads go through a memory map, so
+    processes sharing a file also share its page cache.
+    """
+
+    def __init__(self, path: Path, dimensions: int):
+        self.path = path
+        self.dimensions = dimensions
+        self._row_bytes = dimensions * np.dtype(np.float32).itemsize
+        self._mmap: np.ndarray | None = None
+        self._mmap_key: tuple[int, int] | None = None
+
+    def __len__(self) -> int:
+        try:
+            return os.stat(self.path).st_size // self._row_bytes
+        except FileNotFoundError:
+            return 0
+
+    def append(self, vectors: np.ndarray) -> int:
+        """Append vectors and return the row number of the first one."""
+        data = np.ascontiguousarray(vectors, dtype=np.float32)
+        if data.ndim != 2 or data.shape[1] != self.dimensions:
+            raise ValueError(
+                f"Expected vectors of dimension {self.dimensions}, got shape {data.shape}"
+            )
+        with open(self.path, "ab") as f:
+            # Lock so concurrent writers never interleave or misnumber rows
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                size = f.seek(0, os.SEEK_END)
+                if size % self._row_bytes:
+                    # Drop a torn row left by an interrupted write
+                    size -= size % self._row_bytes
+                    f.truncate(size)
+                f.write(data.tobytes())
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return size // self._row_bytes
+
+    def view(self) -> np.ndarray:
+        """Read-only (rows, dimensions) memmap of the whole file.
+
+        Re-mapped whenever the file has grown or been replaced. Raises
+        FileNotFoundError if the file is gone (e.g. compacted away), rather
+        than handing row numbers meant for it an empty view.
+        """
+        st = os.stat(self.path)
+        rows = st.st_size // self._row_bytes
+        key = (st.st_ino, rows)
+        if self._mmap is None or self._mmap_key != key:
+            if rows == 0:
+                return np.empty((0, self.dimensions), dtype=np.float32)
+            self._mmap = np.memmap(
+                self.path, dtype=np.float32, mode="r", shape=(rows, self.dimensions)
+            )
+            self._mmap_key = key
+        return self._mmap
+
+    def rewrite(self, vectors: np.ndarray) -> None:
+        """Atomically replace the file contents with `vectors`."""
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        np.ascontiguousarray(vectors, dtype=np.float32).tofile(tmp_path)
+        tmp_path.replace(self.path)
+        self._mmap = None
+        self._mmap_key = None
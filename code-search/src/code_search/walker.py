@@ -0,0 +1,217 @@
+"""Directory traversal for load_code: prunes skipped directories and honours ignore files."""
+
+import os
+import re
+import subprocess
+from collections.abc import Iterator
+from dataclasses import dataclass
+
+from code_search.chunker import is_indexable
+
+# Hidden files and directories are skipped too
+EXCLUDED_DIRS = {"node_modules", "__pycache__", ".venv", "venv", "dist", "build"}
+
+# Read in every directory, deeper files overriding shallower ones
+IGNORE_FILES = (".gitignore", ".ignore")
+
+
+@dataclass(frozen=True)
+class _Rule:
+    regex: re.Pattern
+    negate: bool
+    dir_only: bool
+
+
+@dataclass(frozen=True)
+class _RuleSet:
+    base: str  # Directory the rules are relative to, with a trailing separator
+    rules: tuple[_Rule, ...]
+
+
+def _translate(pattern: str) -> str:
+    """Translate a gitignore glob (without anchoring slash) into a regex."""
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == "*":
+            if pattern.startswith("**", i) and (i == 0 or pattern[i - 1] == "/"):
+                if i + 2 == n:
+                    out.append(".*")
+                    i += 2
+                    continue
+                if pattern[i + 2] == "/":
+                    out.append("(?:.*/)?")
+                    i += 3
+                    continue
+            while i + 1 < n and pattern[i + 1] == "*":
+                i += 1
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 2 if pattern[i + 1 : i + 2] in ("!", "]") else i + 1)
+            if end == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1 : end].replace("\\", "\\\\")
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = end
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+def _parse_rule(line: str) -> _Rule | None:
+    line = line.rstrip("\n\r")
+    if not line or line.startswith("#"):
+        return None
+    if not line.endswith("\\ "):
+        line = line.rstrip(" ")
+    negate = line.startswith("!")
+    if negate:
+        line = line[1:]
+    elif line.startswith("\\"):
+        line = line[1:] if line[1:2] in ("!", "#") else line
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+    # A slash anywhere but the end anchors the pattern to the ignore file's directory
+    anchored = "/" in line
+    prefix = "" if anchored else "(?:.*/)?"
+    regex = re.compile(prefix + _translate(line.lstrip("/")) + r"\Z", re.DOTALL)
+    return _Rule(regex, negate, dir_only)
+
+
+def _load_rules(directory: str) -> _RuleSet | None:
+    rules: list[_Rule] = []
+    for name in IGNORE_FILES:
+        try:
+            with open(os.path.join(directory, name), encoding="utf-8", errors="replace") as f:
+                rules.extend(rule for line in f if (rule := _parse_rule(line)))
+        except OSError:
+            continue
+    if not rules:
+        return None
+    return _RuleSet(os.path.join(directory, ""), tuple(rules))
+
+
+def _is_ignored(path: str, is_dir: bool, rule_sets: list[_RuleSet]) -> bool:
+    """Last matching rule wins; rule sets are ordered shallowest first."""
+    ignored = False
+    for rule_set in rule_sets:
+        relative = path[len(rule_set.base) :].replace(os.sep, "/")
+        for rule in rule_set.rules:
+            if rule.dir_only and not is_dir:
+                continue
+            if rule.regex.match(relative):
+                ignored = not rule.negate
+    return ignored
+
+
+def _is_skipped_name(name: str) -> bool:
+    return name.startswith(".") or name in EXCLUDED_DIRS
+
+
+def _git_root(path: str) -> str | None:
+    current = path
+    while True:
+        if os.path.exists(os.path.join(current, ".git")):
+            return current
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+
+def _parent_rules(root: str) -> list[_RuleSet]:
+    """Ignore rules from the repository root down to (but excluding) `root`."""
+    git_root = _git_root(root)
+    if git_root is None or git_root == root:
+        return []
+    rule_sets = []
+    directory = git_root
+    for part in os.path.relpath(root, git_root).split(os.sep):
+        if rule_set := _load_rules(directory):
+            rule_sets.append(rule_set)
+        directory = os.path.join(directory, part)
+    return rule_sets
+
+
+def walk_files(root: str) -> Iterator[str]:
+    """Yield indexable files under `root`, in no particular order.
+
+    Skipped and ignored directories are pruned before they are read, so a
+    large `node_modules` costs one directory entry rather than a full walk.
+    """
+    root = os.path.abspath(root)
+    stack: list[tuple[str, list[_RuleSet]]] = [(root, _parent_rules(root))]
+    while stack:
+        directory, inherited = stack.pop()
+        rule_sets = inherited
+        if rule_set := _load_rules(directory):
+            rule_sets = [*inherited, rule_set]
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if _is_skipped_name(entry.name):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not _is_ignored(entry.path, True, rule_sets):
+                            stack.append((entry.path, rule_sets))
+                    elif (
+                        entry.is_file()
+                        and is_indexable(entry.name)
+                        and not _is_ignored(entry.path, False, rule_sets)
+                    ):
+                        yield entry.path
+                except OSError:
+                    continue
+
+
+def tracked_files(root: str) -> Iterator[str] | None:
+    """Yield indexable files under `root` tracked by git, or None outside a repo."""
+    root = os.path.abspath(root)
+    try:
+        proc = subprocess.run(
+            ["git", "-C", root, "ls-files", "-z", "--cached"],
+            capture_output=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return (
+        os.path.join(root, relative)
+        for relative in os.fsdecode(proc.stdout).split("\0")
+        if relative
+        and is_indexable(relative)
+        and not any(_is_skipped_name(part) for part in relative.split("/"))
+    )
+
+
+def is_excluded(path: str, root: str) -> bool:
+    """Whether walk_files(root) would skip `path`, e.g. for a watched file event."""
+    path, root = os.path.abspath(path), os.path.abspath(root)
+    parts = os.path.relpath(path, root).split(os.sep)
+    if parts[0] == os.pardir or any(_is_skipped_name(part) for part in parts):
+        return True
+    rule_sets = _parent_rules(root)
+    directory = root
+    for i, part in enumerate(parts):
+        if rule_set := _load_rules(directory):
+            rule_sets.append(rule_set)
+        directory = os.path.join(directory, part)
+        if _is_ignored(directory, i < len(parts) - 1, rule_sets):
+            return True
+    return False
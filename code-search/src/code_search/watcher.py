@@ -0,0 +1,102 @@
+"""Background filesystem watcher that keeps the index fresh between load_code calls."""
+
+import asyncio
+import logging
+import os
+from collections.abc import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+DEBOUNCE_MS = 1600  # Longest a burst of events is held before it is flushed
+STEP_MS = 200  # Quiet period that ends a burst early
+
+# Called with (changed paths, deleted paths), each sorted and de-duplicated
+ChangeHandler = Callable[[list[str], list[str]], Awaitable[None]]
+
+
+class IndexWatcher:
+    """Watches directory roots (inotify on Linux) and reports touched files.
+
+    Editors save in bursts (temp file, rename, chmod); watchfiles groups the
+    events of a burst and this class coalesces them per path, so each file is
+    re-indexed once per burst. Events arriving while a batch is being handled
+    queue up and are coalesced into the next one.
+    """
+
+    def __init__(
+        self,
+        on_change: ChangeHandler,
+        path_filter: Callable[[str], bool],
+        debounce_ms: int = DEBOUNCE_MS,
+    ):
+        self._on_change = on_change
+        self._path_filter = path_filter
+        self._debounce_ms = debounce_ms
+        self._roots: set[str] = set()
+        self._task: asyncio.Task | None = None
+        self._stop_event: asyncio.Event | None = None
+
+    @property
+    def roots(self) -> list[str]:
+        return sorted(self._roots)
+
+    def watch(self, roots: list[str]) -> None:
+        """Add directory roots, restarting the watch loop if the set changed."""
+        new_roots = {os.path.realpath(root) for root in roots if os.path.isdir(root)}
+        # A root nested in one already watched is covered recursively
+        new_roots = {
+            root for root in new_roots
+            if not any(_is_within(root, watched) for watched in self._roots)
+        }
+        if not new_roots:
+            return
+        self._roots = {
+            root for root in self._roots
+            if not any(_is_within(root, new) for new in new_roots)
+        } | new_roots
+        self._restart()
+
+    def stop(self) -> None:
+        if self._stop_event is not None:
+            self._stop_event.set()
+        self._task = None
+        self._stop_event = None
+
+    def _restart(self) -> None:
+        self.stop()
+        self._stop_event = asyncio.Event()
+        self._task = asyncio.create_task(self._run(self.roots, self._stop_event))
+
+    async def _run(self, roots: list[str], stop_event: asyncio.Event) -> None:
+        from watchfiles import Change, awatch
+
+        async for events in awatch(
+            *roots,
+            watch_filter=lambda _change, path: self._path_filter(path),
+            debounce=self._debounce_ms,
+            step=STEP_MS,
+            stop_event=stop_event,
+        ):
+            # The last event per path wins: a delete followed by a re-create
+            # (atomic save) is a change
+            latest: dict[str, Change] = {}
+            for change, path in events:
+                latest[path] = change
+            changed = sorted(
+                path for path, change in latest.items()
+                if change != Change.deleted and os.path.isfile(path)
+            )
+            deleted = sorted(
+                path for path, change in latest.items()
+                if change == Change.deleted and not os.path.exists(path)
+            )
+            if not changed and not deleted:
+                continue
+            try:
+                await self._on_change(changed, deleted)
+            except Exception:
+                logger.exception("Re-indexing watched files failed")
+
+
+def _is_within(path: str, root: str) -> bool:
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)